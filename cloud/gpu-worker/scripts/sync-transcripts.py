@@ -6,15 +6,23 @@ Downloads transcripts from S3 to local cache for RAG system.
 
 import os
 import sys
-import json
+import queue
+import hashlib
+import sqlite3
 import argparse
 import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import boto3
-from botocore.exceptions import ClientError
+import orjson
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from s3transfer.exceptions import RetriesExceededError
 from dotenv import load_dotenv
 
 # Add parent directory to path for imports
@@ -35,80 +43,304 @@ logger = logging.getLogger('transcript-sync')
 # AWS Configuration
 TRANSCRIPTS_BUCKET = os.getenv('TRANSCRIPTS_BUCKET')
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '32'))
+# Transcripts live under transcripts/userId/deviceId/; the trailing slash keeps
+# listing inside that prefix (set e.g. transcripts/<userId>/ to sync one user)
+TRANSCRIPTS_PREFIX = os.getenv('TRANSCRIPTS_PREFIX', 'transcripts/')
+LIST_WORKERS = int(os.getenv('LIST_WORKERS', '16'))
 
 if not TRANSCRIPTS_BUCKET:
     logger.error("TRANSCRIPTS_BUCKET not set in .env file")
     sys.exit(1)
 
-# Initialize S3 client
-s3_client = boto3.client('s3', region_name=AWS_REGION)
+MB = 1024 * 1024
 
+USE_S3_ACCEL = os.getenv('USE_S3_ACCEL', '0') == '1'
 
-def load_sync_metadata() -> Dict:
-    """Load sync metadata from local cache."""
-    metadata_file = RAG_CONFIG['metadata_file']
-    if metadata_file.exists():
-        with open(metadata_file, 'r') as f:
-            return json.load(f)
+
+def make_s3_client(region: str):
+    """
+    Create the S3 client shared by all download threads (boto3 clients are thread-safe).
+    
+    The pool must cover the listing threads, the outer download threads and the transfer manager's
+    ranged-GET threads, otherwise requests stall waiting for a free connection. Pooled
+    connections are kept alive and reused, so each TLS handshake is paid once per connection
+    rather than once per request; TCP keepalive stops idle ones being dropped between bursts.
+    Adaptive retries back off client-side when S3 starts throttling (503 SlowDown).
+    """
+    return boto3.client(
+        's3',
+        region_name=region,
+        config=Config(
+            max_pool_connections=max(64, SYNC_WORKERS * 2 + LIST_WORKERS),
+            retries={'max_attempts': 10, 'mode': 'adaptive'},
+            tcp_keepalive=True,
+            s3={'addressing_style': 'virtual', 'use_accelerate_endpoint': USE_S3_ACCEL}
+        )
+    )
+
+
+def get_bucket_region(client) -> str:
+    """Look up the transcripts bucket's region, falling back to AWS_REGION."""
+    try:
+        location = client.get_bucket_location(Bucket=TRANSCRIPTS_BUCKET)['LocationConstraint']
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Could not look up bucket region, using {AWS_REGION}: {e}")
+        return AWS_REGION
+    # us-east-1 buckets report no location constraint
+    return location or 'us-east-1'
+
+
+# Created by connect_s3() from main(): index pool workers re-import this
+# script under spawn, and must not repeat the region lookup or client setup
+s3_client = None
+transfer_manager = None
+
+
+def connect_s3():
+    """Create the shared S3 client and transfer manager."""
+    global s3_client, transfer_manager
+    
+    # Pin the client to the bucket's own regional endpoint so requests aren't
+    # redirected cross-region (optionally via Transfer Acceleration)
+    s3_client = make_s3_client(AWS_REGION)
+    bucket_region = get_bucket_region(s3_client)
+    if bucket_region != AWS_REGION:
+        s3_client = make_s3_client(bucket_region)
+    
+    # Objects above the threshold are split into parallel HTTP Range GETs
+    # instead of a single-stream download
+    transfer_manager = create_transfer_manager(
+        s3_client,
+        TransferConfig(
+            multipart_threshold=1 * MB,
+            multipart_chunksize=1 * MB,
+            max_concurrency=16,
+            use_threads=True
+        )
+    )
+
+
+def open_sync_db() -> sqlite3.Connection:
+    """
+    Open the sync state database in the local cache.
+    
+    Each synced file is one row keyed by S3 key, so recording a download is a
+    single-row upsert instead of rewriting the whole state file. A legacy
+    sync_metadata.json is imported on first use.
+    """
+    db_path = RAG_CONFIG['sync_db']
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS synced_files ("
+        "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, synced_at TEXT)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_info (name TEXT PRIMARY KEY, value TEXT)")
+    
+    legacy_file = RAG_CONFIG['metadata_file']
+    if legacy_file.exists():
+        metadata = orjson.loads(legacy_file.read_bytes())
+        synced_files = metadata.get('synced_files', {})
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO synced_files VALUES (?, ?, ?, ?)",
+                [
+                    (key, info.get('etag'), info.get('last_modified'), info.get('synced_at'))
+                    for key, info in synced_files.items()
+                ]
+            )
+            if metadata.get('last_sync'):
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_info VALUES ('last_sync', ?)",
+                    (metadata['last_sync'],)
+                )
+        legacy_file.rename(legacy_file.with_name(legacy_file.name + '.migrated'))
+        logger.info(f"Imported {len(synced_files)} entries from {legacy_file}")
+    
+    return conn
+
+
+def load_synced_etags(conn: sqlite3.Connection) -> Dict[str, str]:
+    """Load the stored ETag of every synced file."""
+    return dict(conn.execute("SELECT key, etag FROM synced_files"))
+
+
+def transcript_entry(obj: Dict) -> Dict:
+    """Convert a ListObjectsV2 entry into a transcript record."""
     return {
-        'last_sync': None,
-        'synced_files': {},
-        'total_files': 0
+        'key': obj['Key'],
+        'size': obj['Size'],
+        'last_modified': obj['LastModified'].isoformat(),
+        'etag': obj['ETag'].strip('"')
     }
 
 
-def save_sync_metadata(metadata: Dict):
-    """Save sync metadata to local cache."""
-    metadata_file = RAG_CONFIG['metadata_file']
-    metadata_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(metadata_file, 'w') as f:
-        json.dump(metadata, f, indent=2)
+def list_prefix_pages(prefix: str) -> Iterator[List[Dict]]:
+    """List the transcript files under a single S3 prefix, one page at a time."""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(
+        Bucket=TRANSCRIPTS_BUCKET,
+        Prefix=prefix,
+        PaginationConfig={'PageSize': 1000}
+    )
+    
+    for page in pages:
+        yield [
+            transcript_entry(obj)
+            for obj in page.get('Contents', [])
+            if obj['Key'].endswith('.json')
+        ]
+
+
+def put_page(pages: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put an item on the page queue unless the listing was abandoned."""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def feed_prefix(prefix: str, pages: queue.Queue, stop: threading.Event):
+    """
+    List one prefix into the shared page queue.
+    
+    Each listing page is queued as it arrives, followed by None once the
+    prefix is done, or by the exception that ended it.
+    """
+    try:
+        for page in list_prefix_pages(prefix):
+            if not put_page(pages, page, stop):
+                return
+    except Exception as e:
+        put_page(pages, e, stop)
+        return
+    put_page(pages, None, stop)
 
 
-def list_s3_transcripts() -> List[Dict]:
-    """List all transcript files in S3."""
-    logger.info(f"Listing transcripts in s3://{TRANSCRIPTS_BUCKET}/")
-    transcripts = []
+def list_s3_transcripts() -> Iterator[Dict]:
+    """
+    List all transcript files in S3.
+    
+    Raises ClientError/BotoCoreError if listing fails partway; the entries
+    already yielded are valid but the listing is incomplete.
+    
+    The top level of the prefix is listed with a '/' delimiter to discover the
+    per-user sub-prefixes, which are then listed concurrently. Listing pages
+    reach the caller through a bounded queue as soon as any prefix worker
+    gets one, so downloads start after the first page even when a single
+    user holds the whole bucket.
+    """
+    logger.info(f"Listing transcripts in s3://{TRANSCRIPTS_BUCKET}/{TRANSCRIPTS_PREFIX}")
+    found = 0
     
     try:
         paginator = s3_client.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=TRANSCRIPTS_BUCKET)
+        pages = paginator.paginate(
+            Bucket=TRANSCRIPTS_BUCKET,
+            Prefix=TRANSCRIPTS_PREFIX,
+            Delimiter='/',
+            PaginationConfig={'PageSize': 1000}
+        )
         
+        sub_prefixes = []
         for page in pages:
-            if 'Contents' not in page:
-                continue
-                
-            for obj in page['Contents']:
-                key = obj['Key']
-                if key.endswith('.json'):
-                    transcripts.append({
-                        'key': key,
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat(),
-                        'etag': obj['ETag'].strip('"')
-                    })
+            # Keys stored directly under the prefix
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.json'):
+                    found += 1
+                    yield transcript_entry(obj)
+            sub_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
         
-        logger.info(f"Found {len(transcripts)} transcript(s) in S3")
-        return transcripts
+        if sub_prefixes:
+            logger.debug(f"Listing {len(sub_prefixes)} prefix(es) with {LIST_WORKERS} worker(s)")
+            pages = queue.Queue(maxsize=2 * LIST_WORKERS)
+            stop = threading.Event()
+            with ThreadPoolExecutor(max_workers=LIST_WORKERS) as executor:
+                try:
+                    for prefix in sub_prefixes:
+                        executor.submit(feed_prefix, prefix, pages, stop)
+                    
+                    remaining = len(sub_prefixes)
+                    while remaining:
+                        item = pages.get()
+                        if item is None:
+                            remaining -= 1
+                        elif isinstance(item, Exception):
+                            raise item
+                        else:
+                            for transcript in item:
+                                found += 1
+                                yield transcript
+                finally:
+                    # Release workers blocked on a full queue if the caller
+                    # stopped early or a prefix failed
+                    stop.set()
         
-    except ClientError as e:
-        logger.error(f"Failed to list S3 objects: {e}")
-        return []
+        logger.info(f"Found {found} transcript(s) in S3")
+        
+    except (BotoCoreError, ClientError) as e:
+        # Callers must not mistake the transcripts listed so far for all of them
+        logger.error(f"Failed to list S3 objects after {found} transcript(s): {e}")
+        raise
+
 
+def local_etag(local_path: Path) -> str:
+    """MD5 of a local file, which is the S3 ETag of a single-part upload."""
+    md5 = hashlib.md5()
+    with open(local_path, 'rb') as f:
+        for block in iter(lambda: f.read(MB), b''):
+            md5.update(block)
+    return md5.hexdigest()
 
-def download_transcript(s3_key: str, local_path: Path) -> bool:
-    """Download a single transcript from S3."""
+
+def download_transcript(s3_key: str, local_path: Path, revalidate: bool = False) -> str:
+    """
+    Download a single transcript from S3.
+    
+    Args:
+        s3_key: Transcript key in the transcripts bucket
+        local_path: Destination path in the local cache
+        revalidate: If True, an existing local copy is sent as an If-None-Match
+            conditional GET so S3 answers 304 without a body when it is current
+    
+    Returns:
+        'downloaded', 'skipped' (local copy is current) or 'failed'
+    """
     try:
         local_path.parent.mkdir(parents=True, exist_ok=True)
         
+        if revalidate and local_path.exists():
+            logger.debug(f"Revalidating {s3_key} against {local_path}")
+            try:
+                response = s3_client.get_object(
+                    Bucket=TRANSCRIPTS_BUCKET,
+                    Key=s3_key,
+                    IfNoneMatch=f'"{local_etag(local_path)}"'
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('304', 'NotModified'):
+                    return 'skipped'
+                raise
+            local_path.write_bytes(response['Body'].read())
+            return 'downloaded'
+        
         logger.debug(f"Downloading {s3_key} to {local_path}")
-        s3_client.download_file(TRANSCRIPTS_BUCKET, s3_key, str(local_path))
+        transfer_manager.download(
+            bucket=TRANSCRIPTS_BUCKET,
+            key=s3_key,
+            fileobj=str(local_path)
+        ).result()
         
-        return True
+        return 'downloaded'
         
-    except ClientError as e:
+    except (ClientError, RetriesExceededError) as e:
         logger.error(f"Failed to download {s3_key}: {e}")
-        return False
+        return 'failed'
 
 
 def sync_transcripts(full_sync: bool = False) -> Dict:
@@ -119,65 +351,116 @@ def sync_transcripts(full_sync: bool = False) -> Dict:
         full_sync: If True, re-download all files. If False, only download new/updated files.
     
     Returns:
-        Dict with sync statistics
+        Dict with sync statistics, plus the local paths of the files that were
+        downloaded under 'downloaded_paths'. 'listing_complete' is False when
+        the S3 listing failed partway, so some transcripts weren't seen.
     """
     logger.info("Starting transcript sync...")
     
-    # Load existing metadata
-    metadata = load_sync_metadata()
-    synced_files = metadata.get('synced_files', {})
-    
-    # List S3 transcripts
-    s3_transcripts = list_s3_transcripts()
+    # Load existing sync state
+    conn = open_sync_db()
+    synced_etags = load_synced_etags(conn)
     
-    if not s3_transcripts:
-        logger.warning("No transcripts found in S3")
-        return {'downloaded': 0, 'skipped': 0, 'failed': 0}
+    stats = {'downloaded': 0, 'skipped': 0, 'failed': 0, 'listing_complete': True}
+    downloaded_paths = []
+    found = 0
     
-    stats = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+    def record_result(future, transcript):
+        status = future.result()
+        stats[status] += 1
+        if status == 'failed':
+            return
+        
+        if status == 'downloaded':
+            logger.info(f"Downloaded: {transcript['key']}")
+            downloaded_paths.append(RAG_CONFIG['transcripts_dir'] / transcript['key'])
+        else:
+            logger.debug(f"Not modified: {transcript['key']}")
+        conn.execute(
+            "INSERT OR REPLACE INTO synced_files VALUES (?, ?, ?, ?)",
+            (
+                transcript['key'],
+                transcript['etag'],
+                transcript['last_modified'],
+                datetime.utcnow().isoformat()
+            )
+        )
     
-    for transcript in s3_transcripts:
-        s3_key = transcript['key']
-        etag = transcript['etag']
+    try:
+        # Stream listing pages straight into the download pool so downloads overlap
+        # with listing. In-flight work is capped to keep memory flat, and results are
+        # consumed here on the calling thread, which owns the database connection.
+        # All row updates share one transaction, committed when the sync finishes.
+        max_pending = 2 * SYNC_WORKERS
+        with conn, ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
+            pending = {}
+            
+            try:
+                for transcript in list_s3_transcripts():
+                    found += 1
+                    s3_key = transcript['key']
+                    etag = transcript['etag']
+                    
+                    # Determine local path
+                    # S3 key format: transcripts/userId/deviceId/recordingId.json
+                    local_path = RAG_CONFIG['transcripts_dir'] / s3_key
+                    
+                    # Check if we need to download
+                    should_download = full_sync or \
+                                     synced_etags.get(s3_key) != etag or \
+                                     not local_path.exists()
+                    
+                    if not should_download:
+                        logger.debug(f"Skipping (already synced): {s3_key}")
+                        stats['skipped'] += 1
+                        continue
+                    
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record_result(future, pending.pop(future))
+                    
+                    # A local copy the metadata can't vouch for (e.g. lost sync state)
+                    # is revalidated server-side instead of being re-downloaded blindly
+                    revalidate = not full_sync and local_path.exists()
+                    future = executor.submit(download_transcript, s3_key, local_path, revalidate)
+                    pending[future] = transcript
+            
+            except (BotoCoreError, ClientError):
+                # Finish the downloads already started, but don't record a full sync
+                stats['listing_complete'] = False
+            
+            for future in as_completed(pending):
+                record_result(future, pending[future])
         
-        # Determine local path
-        # S3 key format: transcripts/userId/deviceId/recordingId.json
-        local_path = RAG_CONFIG['transcripts_dir'] / s3_key
+        stats['downloaded_paths'] = downloaded_paths
         
-        # Check if we need to download
-        should_download = full_sync or \
-                         s3_key not in synced_files or \
-                         synced_files[s3_key].get('etag') != etag or \
-                         not local_path.exists()
+        if not stats['listing_complete']:
+            logger.warning("S3 listing failed partway; last sync time not updated")
+            return stats
         
-        if should_download:
-            logger.info(f"Downloading: {s3_key}")
-            if download_transcript(s3_key, local_path):
-                synced_files[s3_key] = {
-                    'etag': etag,
-                    'last_modified': transcript['last_modified'],
-                    'synced_at': datetime.utcnow().isoformat()
-                }
-                stats['downloaded'] += 1
-            else:
-                stats['failed'] += 1
-        else:
-            logger.debug(f"Skipping (already synced): {s3_key}")
-            stats['skipped'] += 1
-    
-    # Update metadata
-    metadata['synced_files'] = synced_files
-    metadata['last_sync'] = datetime.utcnow().isoformat()
-    metadata['total_files'] = len(synced_files)
-    save_sync_metadata(metadata)
-    
-    return stats
+        if not found:
+            logger.warning("No transcripts found in S3")
+            return stats
+        
+        # Update sync info
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_info VALUES ('last_sync', ?)",
+                (datetime.utcnow().isoformat(),)
+            )
+        
+        return stats
+    finally:
+        conn.close()
 
 
 def main():
     parser = argparse.ArgumentParser(description='Sync transcripts from S3 to local cache')
     parser.add_argument('--full-sync', action='store_true', 
                        help='Re-download all files (default: incremental sync)')
+    parser.add_argument('--index', action='store_true',
+                       help='Index the downloaded transcripts after syncing')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Enable verbose logging')
     
@@ -190,14 +473,29 @@ def main():
     logger.info("REM Transcript Sync")
     logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
     
+    connect_s3()
     stats = sync_transcripts(full_sync=args.full_sync)
     
     logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-    logger.info(f"✅ Sync complete!")
+    if stats['listing_complete']:
+        logger.info(f"✅ Sync complete!")
+    else:
+        logger.error("❌ Sync incomplete: listing S3 failed partway")
     logger.info(f"   Downloaded: {stats['downloaded']}")
     logger.info(f"   Skipped: {stats['skipped']}")
     logger.info(f"   Failed: {stats['failed']}")
     logger.info("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    
+    if args.index and stats['downloaded_paths']:
+        # The sync already knows what changed, so only those files are indexed
+        sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+        from indexer import TranscriptIndexer
+        
+        index_stats = TranscriptIndexer().index_paths(stats['downloaded_paths'])
+        logger.info(f"✅ Indexed {index_stats['indexed']} transcript(s), {index_stats['total_chunks']} chunk(s)")
+    
+    if not stats['listing_complete']:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
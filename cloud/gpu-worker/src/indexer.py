@@ -6,18 +6,18 @@ Creates embeddings from transcripts and stores them in ChromaDB for semantic sea
 
 import os
 import sys
-import json
+import sqlite3
 import argparse
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from datetime import datetime
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-
-from rag_config import RAG_CONFIG, TRANSCRIPT_METADATA_FIELDS, ensure_directories
+from rag_config import RAG_CONFIG, ensure_directories, get_collection_metadata
+from transcript_prep import prepare_transcript, prepare_transcript_data
 
 # Configure logging
 logging.basicConfig(
@@ -27,18 +27,71 @@ logging.basicConfig(
 logger = logging.getLogger('indexer')
 
 
+def iter_transcript_files(root: Path) -> Iterator[Path]:
+    """
+    Walk a directory tree and yield transcript JSON files as they are found.
+    
+    Uses os.scandir so file types come from the directory entries themselves
+    instead of a separate stat per path.
+    """
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.json') and entry.is_file():
+                    yield Path(entry.path)
+
+
+def iter_synced_files(db_path: Path, root: Path) -> Iterator[Path]:
+    """
+    Yield the local transcript files recorded by sync-transcripts.py.
+    
+    The sync database already lists every synced key, so the cache directory
+    doesn't need to be walked to find them. The keys are read in one query
+    and the connection closed before any path is yielded: the caller pulls
+    paths only as fast as it indexes them, and a cursor left open that long
+    would hold a read lock against a concurrent sync.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        keys = [key for (key,) in conn.execute("SELECT key FROM synced_files")]
+    finally:
+        conn.close()
+    
+    for key in keys:
+        path = root / key
+        if path.exists():
+            yield path
+
+
 class TranscriptIndexer:
     """Handles indexing of transcripts into ChromaDB."""
     
     def __init__(self):
         """Initialize the indexer with embedding model and vector database."""
+        # Imported here rather than at module level: process pool workers
+        # re-import the main module under spawn (the macOS default), and
+        # should not pull in torch and ChromaDB just to parse JSON
+        import chromadb
+        from chromadb.config import Settings
+        from sentence_transformers import SentenceTransformer
+        
         ensure_directories()
         
         logger.info("Initializing indexer...")
         
         # Initialize embedding model
         logger.info(f"Loading embedding model: {RAG_CONFIG['embedding_model']}")
-        self.embedding_model = SentenceTransformer(RAG_CONFIG['embedding_model'])
+        self.embedding_model = SentenceTransformer(
+            RAG_CONFIG['embedding_model'],
+            device=RAG_CONFIG['device']
+        )
+        if RAG_CONFIG['embedding_fp16'] and self.embedding_model.device.type == 'cuda':
+            # FP16 doubles encode throughput on tensor cores
+            self.embedding_model.half()
+        logger.info(f"Embedding model on {self.embedding_model.device}")
         
         # Initialize ChromaDB
         logger.info(f"Connecting to ChromaDB at {RAG_CONFIG['chroma_dir']}")
@@ -50,194 +103,197 @@ class TranscriptIndexer:
         # Get or create collection
         self.collection = self.chroma_client.get_or_create_collection(
             name=RAG_CONFIG['collection_name'],
-            metadata={"hnsw:space": RAG_CONFIG['distance_metric']}
+            metadata=get_collection_metadata()
         )
         
+        # HNSW settings are fixed when a collection is created, so an older index
+        # keeps its original space until it is rebuilt
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        if space != RAG_CONFIG['distance_metric']:
+            logger.warning(
+                f"Collection uses '{space}' distance, expected '{RAG_CONFIG['distance_metric']}'; "
+                "run with --reindex to rebuild it"
+            )
+        
         logger.info(f"Collection '{RAG_CONFIG['collection_name']}' ready")
         logger.info(f"Current collection size: {self.collection.count()} chunks")
     
-    def chunk_transcript(self, transcript: Dict) -> List[Dict]:
-        """
-        Split transcript into semantic chunks.
+    @staticmethod
+    def chunk_metadatas(prepared: Dict, indices: List[int]) -> List[Dict]:
+        """Build ChromaDB metadata rows for the selected chunks of a prepared transcript."""
+        base = prepared['metadata']
+        columns = prepared['chunk_columns']
         
-        Args:
-            transcript: Transcript JSON object
-            
-        Returns:
-            List of chunks with text and metadata
+        # Chunk-level values stay in their native types until this point
+        return [
+            {**base, **{field: str(values[i]) for field, values in columns.items()}}
+            for i in indices
+        ]
+    
+    def prepare_transcripts(self, transcript_files: Iterable[Path]) -> Iterator[Optional[Dict]]:
         """
-        chunks = []
-        segments = transcript.get('segments', [])
+        Prepare transcript files in order, fanning out to a process pool.
         
-        if not segments:
-            logger.warning(f"No segments found in transcript {transcript.get('recordingId')}")
-            return chunks
+        Only parsing and chunking run in the workers; the embedding model and
+        ChromaDB client stay in this process. At most two files per worker are
+        in flight, so files are discovered and prepared only as fast as the
+        caller consumes them instead of all being submitted up front.
         
-        # Combine segments into chunks based on word count
-        current_chunk = []
-        current_word_count = 0
-        chunk_index = 0
-        
-        for segment in segments:
-            text = segment.get('text', '').strip()
-            if not text:
-                continue
-            
-            words = text.split()
-            word_count = len(words)
-            
-            # Add segment to current chunk
-            current_chunk.append(segment)
-            current_word_count += word_count
-            
-            # Check if chunk is large enough
-            if current_word_count >= RAG_CONFIG['chunk_size']:
-                # Create chunk
-                chunk_text = ' '.join([s.get('text', '') for s in current_chunk])
-                chunk_start = current_chunk[0].get('start', 0)
-                chunk_end = current_chunk[-1].get('end', 0)
-                
-                chunks.append({
-                    'text': chunk_text,
-                    'chunk_index': chunk_index,
-                    'start_time': chunk_start,
-                    'end_time': chunk_end,
-                    'word_count': current_word_count
-                })
-                
-                # Start new chunk with overlap
-                overlap_words = RAG_CONFIG['chunk_overlap']
-                if overlap_words > 0 and len(current_chunk) > 1:
-                    # Keep last segment for overlap
-                    current_chunk = [current_chunk[-1]]
-                    current_word_count = len(current_chunk[0].get('text', '').split())
-                else:
-                    current_chunk = []
-                    current_word_count = 0
-                
-                chunk_index += 1
-        
-        # Add remaining segments as final chunk
-        if current_chunk:
-            chunk_text = ' '.join([s.get('text', '') for s in current_chunk])
-            chunk_start = current_chunk[0].get('start', 0)
-            chunk_end = current_chunk[-1].get('end', 0)
-            
-            chunks.append({
-                'text': chunk_text,
-                'chunk_index': chunk_index,
-                'start_time': chunk_start,
-                'end_time': chunk_end,
-                'word_count': current_word_count
-            })
+        A handful of files (e.g. what one sync just downloaded) are prepared
+        inline, since starting the pool would cost more than the parsing.
+        """
+        files = iter(transcript_files)
+        workers = RAG_CONFIG['index_workers']
+        head = list(islice(files, RAG_CONFIG['index_pool_min_files']))
+        if workers <= 1 or len(head) < RAG_CONFIG['index_pool_min_files']:
+            for transcript_file in chain(head, files):
+                yield prepare_transcript(transcript_file)
+            return
         
-        return chunks
+        files = chain(head, files)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            window = deque(
+                executor.submit(prepare_transcript, transcript_file)
+                for _, transcript_file in zip(range(2 * workers), files)
+            )
+            while window:
+                prepared = window.popleft().result()
+                # Refill before handing the result over, so the pool keeps
+                # working while the caller embeds
+                for transcript_file in files:
+                    window.append(executor.submit(prepare_transcript, transcript_file))
+                    break
+                yield prepared
     
-    def extract_metadata(self, transcript: Dict, chunk: Dict) -> Dict:
-        """Extract metadata from transcript and chunk."""
-        metadata = {}
-        
-        # Extract transcript-level metadata
-        for field in TRANSCRIPT_METADATA_FIELDS:
-            if field in transcript:
-                value = transcript[field]
-                # Convert to string for ChromaDB compatibility
-                metadata[field] = str(value) if value is not None else ''
+    def get_existing_ids(self, ids: List[str]) -> Set[str]:
+        """Return the subset of chunk IDs already stored in ChromaDB."""
+        existing = set()
+        batch_size = RAG_CONFIG['add_batch_size']
         
-        # Add chunk-level metadata
-        metadata['chunk_index'] = str(chunk['chunk_index'])
-        metadata['start_time'] = str(chunk['start_time'])
-        metadata['end_time'] = str(chunk['end_time'])
-        metadata['word_count'] = str(chunk['word_count'])
+        for start in range(0, len(ids), batch_size):
+            result = self.collection.get(ids=ids[start:start + batch_size], include=[])
+            existing.update(result['ids'])
         
-        # Add full text if available (for context)
-        if 'fullText' in transcript:
-            metadata['full_text_preview'] = transcript['fullText'][:200]
-        
-        # Add AI enhancements if available
-        if 'summary' in transcript:
-            metadata['summary'] = transcript['summary'][:500]
-        if 'topics' in transcript and transcript['topics']:
-            metadata['topics'] = ', '.join(transcript['topics'][:5])
+        return existing
+    
+    def add_chunks(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Embed chunks and add them to ChromaDB in fixed-size batches."""
+        logger.debug(f"Generating embeddings for {len(texts)} chunk(s)")
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=RAG_CONFIG['batch_size'],
+            show_progress_bar=len(texts) > RAG_CONFIG['batch_size'],
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
         
-        return metadata
+        # One add per batch amortizes HNSW insertion and SQLite commit overhead
+        batch_size = RAG_CONFIG['add_batch_size']
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end].tolist(),
+                documents=texts[start:end],
+                metadatas=metadatas[start:end]
+            )
     
-    def index_transcript(self, transcript_path: Path) -> Tuple[int, int]:
+    def index_transcript(self, transcript_path: Union[Path, Dict]) -> Tuple[int, int]:
         """
-        Index a single transcript file.
+        Index a single transcript.
         
         Args:
-            transcript_path: Path to transcript JSON file
+            transcript_path: Path to transcript JSON file, or the already-loaded
+                transcript data (as the GPU worker passes it)
             
         Returns:
             Tuple of (chunks_added, chunks_skipped)
         """
         try:
-            with open(transcript_path, 'r') as f:
-                transcript = json.load(f)
-            
-            recording_id = transcript.get('recordingId')
-            if not recording_id:
-                logger.warning(f"No recordingId in {transcript_path}")
+            if isinstance(transcript_path, dict):
+                prepared = prepare_transcript_data(transcript_path)
+            else:
+                prepared = prepare_transcript(transcript_path)
+            if not prepared:
                 return (0, 0)
             
-            # Check if already indexed
-            existing = self.collection.get(
-                where={"recordingId": recording_id}
-            )
+            recording_id = prepared['recording_id']
             
-            if existing['ids']:
+            # Check if already indexed (ID lookups instead of a metadata scan)
+            existing = self.get_existing_ids(prepared['ids'])
+            new = [i for i, chunk_id in enumerate(prepared['ids']) if chunk_id not in existing]
+            
+            if not new:
                 logger.debug(f"Already indexed: {recording_id}")
-                return (0, len(existing['ids']))
+                return (0, len(existing))
 
-            # Chunk the transcript
-            chunks = self.chunk_transcript(transcript)
+            logger.info(f"Indexing {recording_id}: {len(new)} chunk(s)")
 
-            if not chunks:
-                logger.warning(f"No chunks created for {recording_id}")
-                return (0, 0)
-
-            logger.info(f"Indexing {recording_id}: {len(chunks)} chunk(s)")
-
-            # Prepare data for ChromaDB
-            ids = []
-            texts = []
-            metadatas = []
-
-            for chunk in chunks:
-                chunk_id = f"{recording_id}_chunk_{chunk['chunk_index']}"
-                ids.append(chunk_id)
-                texts.append(chunk['text'])
-                metadatas.append(self.extract_metadata(transcript, chunk))
-
-            # Generate embeddings
-            logger.debug(f"Generating embeddings for {len(texts)} chunk(s)")
-            embeddings = self.embedding_model.encode(
-                texts,
-                batch_size=RAG_CONFIG['batch_size'],
-                show_progress_bar=False,
-                convert_to_numpy=True
-            )
-
-            # Add to ChromaDB
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings.tolist(),
-                documents=texts,
-                metadatas=metadatas
+            self.add_chunks(
+                [prepared['ids'][i] for i in new],
+                [prepared['texts'][i] for i in new],
+                self.chunk_metadatas(prepared, new)
             )
 
-            logger.info(f"✅ Indexed {recording_id}: {len(chunks)} chunk(s)")
-            return (len(chunks), 0)
+            logger.info(f"✅ Indexed {recording_id}: {len(new)} chunk(s)")
+            return (len(new), len(existing))
 
         except Exception as e:
             logger.error(f"Failed to index {transcript_path}: {e}")
             return (0, 0)
 
+    def index_prepared(self, prepared: List[Dict], stats: Dict, seen: Set[str]):
+        """
+        Embed and add the new chunks of a batch of prepared transcripts.
+        
+        Args:
+            prepared: Results of prepare_transcript
+            stats: Indexing statistics, updated in place
+            seen: Chunk IDs already added during this run
+        """
+        # One bulk ID lookup replaces a metadata-filtered query per transcript
+        existing = self.get_existing_ids([chunk_id for item in prepared for chunk_id in item['ids']])
+        existing |= seen
+
+        ids, texts, metadatas = [], [], []
+        indexed = 0
+        for item in prepared:
+            new = [i for i, chunk_id in enumerate(item['ids']) if chunk_id not in existing]
+
+            if not new:
+                logger.debug(f"Already indexed: {item['recording_id']}")
+                stats['skipped'] += 1
+                continue
+
+            ids.extend(item['ids'][i] for i in new)
+            texts.extend(item['texts'][i] for i in new)
+            metadatas.extend(self.chunk_metadatas(item, new))
+            # Guard against duplicate IDs when two files share a recordingId
+            existing.update(item['ids'])
+            indexed += 1
+
+        if not ids:
+            return
+
+        logger.info(f"Embedding {len(ids)} chunk(s) from {indexed} transcript(s)")
+        try:
+            self.add_chunks(ids, texts, metadatas)
+        except Exception as e:
+            logger.error(f"Failed to add chunks to ChromaDB: {e}")
+            stats['failed'] += indexed
+            return
+
+        seen.update(ids)
+        stats['indexed'] += indexed
+        stats['total_chunks'] += len(ids)
+
     def index_all_transcripts(self, reindex: bool = False) -> Dict:
         """
         Index all transcripts in the local cache.
 
+        Files are taken from the sync database when there is one, falling back
+        to walking the cache directory.
+
         Args:
             reindex: If True, re-index all transcripts. If False, skip already indexed.
 
@@ -249,16 +305,7 @@ class TranscriptIndexer:
         if not transcripts_dir.exists():
             logger.error(f"Transcripts directory not found: {transcripts_dir}")
             logger.error("Run sync-transcripts.py first to download transcripts")
-            return {'indexed': 0, 'skipped': 0, 'failed': 0}
-
-        # Find all transcript JSON files
-        transcript_files = list(transcripts_dir.rglob('*.json'))
-
-        if not transcript_files:
-            logger.warning(f"No transcript files found in {transcripts_dir}")
-            return {'indexed': 0, 'skipped': 0, 'failed': 0}
-
-        logger.info(f"Found {len(transcript_files)} transcript file(s)")
+            return {'processed': 0, 'indexed': 0, 'skipped': 0, 'failed': 0, 'total_chunks': 0}
 
         # Clear collection if reindexing
         if reindex:
@@ -266,23 +313,60 @@ class TranscriptIndexer:
             self.chroma_client.delete_collection(RAG_CONFIG['collection_name'])
             self.collection = self.chroma_client.create_collection(
                 name=RAG_CONFIG['collection_name'],
-                metadata={"hnsw:space": RAG_CONFIG['distance_metric']}
+                metadata=get_collection_metadata()
             )
 
-        stats = {'indexed': 0, 'skipped': 0, 'failed': 0, 'total_chunks': 0}
+        if RAG_CONFIG['sync_db'].exists():
+            transcript_files = iter_synced_files(RAG_CONFIG['sync_db'], transcripts_dir)
+        else:
+            transcript_files = iter_transcript_files(transcripts_dir)
 
-        for i, transcript_file in enumerate(transcript_files, 1):
-            logger.info(f"[{i}/{len(transcript_files)}] Processing {transcript_file.name}")
+        stats = self.index_paths(transcript_files)
 
-            chunks_added, chunks_skipped = self.index_transcript(transcript_file)
+        if not stats['processed']:
+            logger.warning(f"No transcript files found in {transcripts_dir}")
 
-            if chunks_added > 0:
-                stats['indexed'] += 1
-                stats['total_chunks'] += chunks_added
-            elif chunks_skipped > 0:
-                stats['skipped'] += 1
-            else:
+        return stats
+
+    def index_paths(self, transcript_files: Iterable[Path]) -> Dict:
+        """
+        Index an explicit set of transcript files.
+
+        Chunks are embedded and added in large batches instead of once per file.
+
+        Args:
+            transcript_files: Transcript JSON files, e.g. the paths a sync just downloaded
+
+        Returns:
+            Dict with indexing statistics
+        """
+        stats = {'processed': 0, 'indexed': 0, 'skipped': 0, 'failed': 0, 'total_chunks': 0}
+
+        # Transcript files are pulled into the prepare workers a few at a time, as
+        # results are consumed. Prepared transcripts are embedded in batches while the
+        # pool keeps parsing the next ones, so CPU chunking and GPU encoding overlap
+        # instead of alternating.
+        batch, batch_chunks = [], 0
+        seen = set()
+        for item in self.prepare_transcripts(transcript_files):
+            stats['processed'] += 1
+
+            if not item:
                 stats['failed'] += 1
+                continue
+
+            logger.info(f"[{stats['processed']}] Prepared {item['recording_id']}: {len(item['ids'])} chunk(s)")
+            batch.append(item)
+            batch_chunks += len(item['ids'])
+
+            if batch_chunks >= RAG_CONFIG['add_batch_size']:
+                self.index_prepared(batch, stats, seen)
+                batch, batch_chunks = [], 0
+
+        if batch:
+            self.index_prepared(batch, stats, seen)
+
+        logger.info(f"Processed {stats['processed']} transcript file(s)")
 
         return stats
 
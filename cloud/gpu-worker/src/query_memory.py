@@ -4,12 +4,19 @@ REM Memory Query Interface
 Query your transcribed memories using natural language.
 """
 
+import io
 import sys
+import asyncio
+import atexit
+import functools
 import argparse
 import logging
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
 
+import httpx
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
@@ -25,18 +32,59 @@ logging.basicConfig(
 logger = logging.getLogger('query-memory')
 
 
+@functools.lru_cache(maxsize=4096)
+def format_started_at(started_at: str) -> str:
+    """Format an ISO-8601 recording start time for display; cached as recordings recur across queries."""
+    if started_at == 'Unknown date':
+        return started_at
+    try:
+        dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+        return dt.strftime('%Y-%m-%d %H:%M')
+    except Exception:
+        return started_at
+
+
+CONTEXT_SEPARATOR = "\n" + "=" * 80 + "\n"
+
+def log_llm_error(error: Exception):
+    """Log a failed LLM call, with a hint when Ollama isn't reachable."""
+    logger.error(f"Failed to generate answer: {error}")
+    if isinstance(error, (ConnectionError, httpx.ConnectError)):
+        logger.error("Make sure Ollama is running: brew services start ollama")
+
+
+NO_RESULTS_ANSWER = "I couldn't find any relevant information in your transcripts to answer that question."
+
+
 class MemoryQuery:
     """Handles querying of indexed transcripts."""
     
-    def __init__(self):
-        """Initialize the query system."""
+    def __init__(self, use_llm: bool = True):
+        """
+        Initialize the query system.
+        
+        Args:
+            use_llm: Set up the Ollama client; not needed for search-only use
+        """
         ensure_directories()
         
         logger.info("Initializing query system...")
         
         # Initialize embedding model
         logger.info(f"Loading embedding model: {RAG_CONFIG['embedding_model']}")
-        self.embedding_model = SentenceTransformer(RAG_CONFIG['embedding_model'])
+        self.embedding_model = SentenceTransformer(
+            RAG_CONFIG['embedding_model'],
+            device=RAG_CONFIG['device']
+        )
+        if RAG_CONFIG['embedding_fp16'] and self.embedding_model.device.type == 'cuda':
+            # Same precision as the indexer, so query and chunk vectors match
+            self.embedding_model.half()
+        # Warm up so the first question doesn't pay for kernel setup on the device
+        self.embedding_model.encode("warmup", convert_to_numpy=True)
+        logger.info(f"Embedding model on {self.embedding_model.device}")
+        # Query embeddings in least-recently-used order, kept across restarts
+        self.query_cache = self.load_query_cache()
+        atexit.register(self.save_query_cache)
         
         # Initialize ChromaDB
         logger.info(f"Connecting to ChromaDB at {RAG_CONFIG['chroma_dir']}")
@@ -56,14 +104,114 @@ class MemoryQuery:
             logger.error("Run indexer.py first to create the index")
             sys.exit(1)
         
-        # Check Ollama
+        # Similarity is derived as 1 - distance, which only holds for cosine distance
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        if space != 'cosine':
+            logger.warning(f"Collection uses '{space}' distance; similarity scores will be off. "
+                           "Rebuild it with: indexer.py --reindex")
+        
+        # One Ollama client for every answer (it reads OLLAMA_HOST). Availability is
+        # checked by the first real request instead of an extra round-trip at startup.
+        self.ollama_client = ollama.Client() if use_llm else None
+        if use_llm:
+            logger.info(f"Using LLM model: {RAG_CONFIG['llm_model']}")
+    
+    def load_query_cache(self) -> OrderedDict:
+        """Load query embeddings saved by a previous run of the same model."""
+        cache_file = RAG_CONFIG['query_cache_file']
+        if not cache_file.exists():
+            return OrderedDict()
+        
+        # Plain arrays only (no pickle), so a tampered file can't run code
         try:
-            ollama.list()
-            logger.info(f"Ollama connected, using model: {RAG_CONFIG['llm_model']}")
+            with np.load(cache_file, allow_pickle=False) as cached:
+                model = str(cached['model'])
+                queries = cached['queries'].tolist()
+                embeddings = cached['embeddings']
+            if model != RAG_CONFIG['embedding_model']:
+                logger.debug(f"Ignoring query cache from another model: {model}")
+                return OrderedDict()
+            if embeddings.ndim != 2 or len(embeddings) != len(queries):
+                raise ValueError(f"unexpected embeddings shape {embeddings.shape}")
         except Exception as e:
-            logger.error(f"Ollama not available: {e}")
-            logger.error("Make sure Ollama is running: brew services start ollama")
-            sys.exit(1)
+            logger.warning(f"Ignoring unreadable query cache: {e}")
+            return OrderedDict()
+        
+        logger.debug(f"Loaded {len(queries)} cached query embedding(s)")
+        recent = slice(-RAG_CONFIG['query_cache_size'], None)
+        return OrderedDict(zip(queries[recent], embeddings[recent]))
+    
+    def save_query_cache(self):
+        """Persist cached query embeddings for the next run."""
+        if not self.query_cache:
+            return
+        
+        cache_file = RAG_CONFIG['query_cache_file']
+        tmp_file = cache_file.with_suffix('.tmp')
+        try:
+            with open(tmp_file, 'wb') as f:
+                np.savez(
+                    f,
+                    model=np.array(RAG_CONFIG['embedding_model']),
+                    queries=np.array(list(self.query_cache), dtype=str),
+                    embeddings=np.stack(list(self.query_cache.values())).astype(np.float32)
+                )
+            tmp_file.replace(cache_file)
+        except Exception as e:
+            logger.warning(f"Failed to save query cache: {e}")
+    
+    def cache_query_embedding(self, query: str, embedding: np.ndarray):
+        """Cache a query embedding, evicting the least recently used past query_cache_size."""
+        self.query_cache[query] = embedding
+        self.query_cache.move_to_end(query)
+        while len(self.query_cache) > RAG_CONFIG['query_cache_size']:
+            self.query_cache.popitem(last=False)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a query, reusing the embedding of an identical earlier query.
+        
+        The cache is kept in least-recently-used order and capped at
+        query_cache_size entries.
+        """
+        embedding = self.query_cache.get(query)
+        if embedding is not None:
+            self.query_cache.move_to_end(query)
+            return embedding
+        
+        embedding = self.embedding_model.encode(
+            query,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        self.cache_query_embedding(query, embedding)
+        
+        return embedding
+    
+    def embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Embed several queries, encoding all cache misses in one batch."""
+        # Results are collected here rather than read back from the cache,
+        # which may already have evicted some of them
+        found = {}
+        for query in dict.fromkeys(queries):
+            embedding = self.query_cache.get(query)
+            if embedding is not None:
+                self.query_cache.move_to_end(query)
+                found[query] = embedding
+        
+        missing = [query for query in dict.fromkeys(queries) if query not in found]
+        if missing:
+            embeddings = self.embedding_model.encode(
+                missing,
+                batch_size=RAG_CONFIG['batch_size'],
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            for query, embedding in zip(missing, embeddings):
+                found[query] = embedding
+                self.cache_query_embedding(query, embedding)
+        
+        return [found[query] for query in queries]
     
     def search(self, query: str, top_k: int = None) -> List[Dict]:
         """
@@ -82,77 +230,97 @@ class MemoryQuery:
         logger.info(f"Searching for: '{query}'")
         
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(
-            query,
-            convert_to_numpy=True
-        )
+        query_embedding = self.embed_query(query)
+        
+        chunks = self.search_embeddings([query_embedding], top_k)[0]
         
-        # Search ChromaDB
+        logger.info(f"Found {len(chunks)} relevant chunk(s)")
+        return chunks
+    
+    def search_embeddings(self, query_embeddings: List[np.ndarray], top_k: int = None) -> List[List[Dict]]:
+        """Run one ChromaDB query for several query embeddings; one chunk list per query."""
+        if top_k is None:
+            top_k = RAG_CONFIG['top_k_results']
+        
+        # Search ChromaDB (chromadb 0.4 only accepts embeddings as Python lists,
+        # so the numpy vectors are converted rather than passed through).
+        # Documents are left out here and fetched below only for chunks that
+        # pass the similarity filter.
         results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
+            query_embeddings=[embedding.tolist() for embedding in query_embeddings],
             n_results=top_k,
-            include=['documents', 'metadatas', 'distances']
+            include=['metadatas', 'distances']
         )
         
         # Format results
-        chunks = []
-        for i in range(len(results['ids'][0])):
-            chunk = {
-                'id': results['ids'][0][i],
-                'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i],
-                'similarity': 1 - results['distances'][0][i]  # Convert distance to similarity
-            }
-            
-            # Filter by minimum similarity
-            if chunk['similarity'] >= RAG_CONFIG['min_similarity']:
-                chunks.append(chunk)
+        all_chunks = []
+        for q in range(len(query_embeddings)):
+            chunks = []
+            for i in range(len(results['ids'][q])):
+                chunk = {
+                    'id': results['ids'][q][i],
+                    'metadata': results['metadatas'][q][i],
+                    'distance': results['distances'][q][i],
+                    'similarity': 1 - results['distances'][q][i]  # Convert distance to similarity
+                }
+                
+                # Filter by minimum similarity
+                if chunk['similarity'] >= RAG_CONFIG['min_similarity']:
+                    chunks.append(chunk)
+            all_chunks.append(chunks)
         
-        logger.info(f"Found {len(chunks)} relevant chunk(s)")
-        return chunks
+        kept_ids = list(dict.fromkeys(chunk['id'] for chunks in all_chunks for chunk in chunks))
+        if kept_ids:
+            documents = self.collection.get(ids=kept_ids, include=['documents'])
+            texts = dict(zip(documents['ids'], documents['documents']))
+            for chunks in all_chunks:
+                for chunk in chunks:
+                    chunk['text'] = texts[chunk['id']]
+        
+        return all_chunks
     
-    def format_context(self, chunks: List[Dict]) -> str:
-        """Format retrieved chunks into context for LLM."""
+    def write_context(self, chunks: List[Dict], buf: io.StringIO):
+        """Write the LLM context for retrieved chunks into buf."""
         if not chunks:
-            return "No relevant information found in transcripts."
+            buf.write("No relevant information found in transcripts.")
+            return
         
-        context_parts = []
         for i, chunk in enumerate(chunks, 1):
             metadata = chunk['metadata']
             
             # Format timestamp
-            started_at = metadata.get('startedAt', 'Unknown date')
-            if started_at != 'Unknown date':
-                try:
-                    dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                    started_at = dt.strftime('%Y-%m-%d %H:%M')
-                except:
-                    pass
-            
-            # Format chunk info
-            chunk_info = f"[Recording {i}]\n"
-            chunk_info += f"Date: {started_at}\n"
-            chunk_info += f"Recording ID: {metadata.get('recordingId', 'Unknown')}\n"
-            chunk_info += f"Device: {metadata.get('deviceId', 'Unknown')}\n"
-            chunk_info += f"Time in recording: {metadata.get('start_time', '0')}s - {metadata.get('end_time', '0')}s\n"
+            started_at = format_started_at(metadata.get('startedAt', 'Unknown date'))
             
-            if 'topics' in metadata and metadata['topics']:
-                chunk_info += f"Topics: {metadata['topics']}\n"
+            topics = f"Topics: {metadata['topics']}\n" if metadata.get('topics') else ""
             
-            chunk_info += f"\nTranscript:\n{chunk['text']}\n"
+            if i > 1:
+                buf.write(CONTEXT_SEPARATOR)
             
-            context_parts.append(chunk_info)
-        
-        return "\n" + "="*80 + "\n".join(context_parts)
+            # Format chunk info
+            buf.write(
+                f"[Recording {i}]\n"
+                f"Date: {started_at}\n"
+                f"Recording ID: {metadata.get('recordingId', 'Unknown')}\n"
+                f"Device: {metadata.get('deviceId', 'Unknown')}\n"
+                f"Time in recording: {metadata.get('start_time', '0')}s - {metadata.get('end_time', '0')}s\n"
+                f"{topics}"
+                f"\nTranscript:\n{chunk['text']}\n"
+            )
     
-    def query(self, question: str, show_sources: bool = True) -> str:
+    def query(
+        self,
+        question: str,
+        show_sources: bool = True,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
         """
         Query the memory system with a natural language question.
         
         Args:
             question: Natural language question
             show_sources: Whether to show source citations
+            on_token: If given, the answer is streamed and each piece (then the
+                sources block) is passed to it as it arrives
             
         Returns:
             Answer from LLM
@@ -161,53 +329,110 @@ class MemoryQuery:
         chunks = self.search(question)
         
         if not chunks:
-            return "I couldn't find any relevant information in your transcripts to answer that question."
-        
-        # Format context
-        context = self.format_context(chunks)
-        
-        # Build prompt
-        prompt = f"""Based on the following transcript excerpts from voice recordings, please answer the question.
-
-{context}
-
-Question: {question}
-
-Answer:"""
+            return NO_RESULTS_ANSWER
         
         # Query LLM
         logger.info("Generating answer with LLM...")
         
         try:
-            response = ollama.chat(
-                model=RAG_CONFIG['llm_model'],
-                messages=[
-                    {'role': 'system', 'content': SYSTEM_PROMPTS['query']},
-                    {'role': 'user', 'content': prompt}
-                ],
-                options={
-                    'temperature': RAG_CONFIG['llm_temperature'],
-                    'num_predict': RAG_CONFIG['llm_max_tokens']
-                }
+            response = self.ollama_client.chat(
+                **self.chat_request(question, chunks),
+                stream=on_token is not None
             )
             
-            answer = response['message']['content']
+            if on_token is None:
+                answer = response['message']['content']
+            else:
+                # Hand tokens over as they are generated instead of after the whole answer
+                parts = []
+                for part in response:
+                    token = part['message']['content']
+                    parts.append(token)
+                    on_token(token)
+                answer = ''.join(parts)
             
             # Add sources if requested
             if show_sources:
-                answer += "\n\n" + "─" * 80 + "\n"
-                answer += f"📚 Sources: {len(chunks)} recording(s)\n"
-                for i, chunk in enumerate(chunks, 1):
-                    metadata = chunk['metadata']
-                    answer += f"  {i}. Recording {metadata.get('recordingId', 'Unknown')[:8]}... "
-                    answer += f"({metadata.get('startedAt', 'Unknown date')[:10]})\n"
+                sources = self.format_sources(chunks)
+                answer += sources
+                if on_token is not None:
+                    on_token(sources)
 
             return answer
 
         except Exception as e:
-            logger.error(f"Failed to generate answer: {e}")
+            log_llm_error(e)
             return f"Error generating answer: {e}"
 
+    def query_batch(self, questions: List[str], show_sources: bool = True) -> List[str]:
+        """
+        Answer several questions at once.
+        
+        All questions are embedded in one batch and searched with one ChromaDB
+        query, then the LLM calls run concurrently.
+        
+        Returns:
+            One answer per question, in order
+        """
+        logger.info(f"Searching for {len(questions)} question(s)")
+        all_chunks = self.search_embeddings(self.embed_queries(questions))
+        
+        async def answer(client: ollama.AsyncClient, question: str, chunks: List[Dict]) -> str:
+            if not chunks:
+                return NO_RESULTS_ANSWER
+            try:
+                response = await client.chat(**self.chat_request(question, chunks))
+            except Exception as e:
+                log_llm_error(e)
+                return f"Error generating answer: {e}"
+            
+            result = response['message']['content']
+            if show_sources:
+                result += self.format_sources(chunks)
+            return result
+        
+        async def answer_all() -> List[str]:
+            client = ollama.AsyncClient()
+            return await asyncio.gather(*[
+                answer(client, question, chunks)
+                for question, chunks in zip(questions, all_chunks)
+            ])
+        
+        logger.info("Generating answers with LLM...")
+        return asyncio.run(answer_all())
+
+    def chat_request(self, question: str, chunks: List[Dict]) -> Dict:
+        """Build the Ollama chat arguments for a question and its retrieved chunks."""
+        # Build prompt, writing the context straight into it rather than
+        # formatting it separately and copying it in afterwards
+        buf = io.StringIO()
+        buf.write("Based on the following transcript excerpts from voice recordings, please answer the question.\n\n")
+        self.write_context(chunks, buf)
+        buf.write(f"\n\nQuestion: {question}\n\nAnswer:")
+        prompt = buf.getvalue()
+        
+        return {
+            'model': RAG_CONFIG['llm_model'],
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPTS['query']},
+                {'role': 'user', 'content': prompt}
+            ],
+            'options': {
+                'temperature': RAG_CONFIG['llm_temperature'],
+                'num_predict': RAG_CONFIG['llm_max_tokens']
+            }
+        }
+
+    def format_sources(self, chunks: List[Dict]) -> str:
+        """Format the source citations appended to an answer."""
+        sources = "\n\n" + "─" * 80 + "\n"
+        sources += f"📚 Sources: {len(chunks)} recording(s)\n"
+        for i, chunk in enumerate(chunks, 1):
+            metadata = chunk['metadata']
+            sources += f"  {i}. Recording {metadata.get('recordingId', 'Unknown')[:8]}... "
+            sources += f"({metadata.get('startedAt', 'Unknown date')[:10]})\n"
+        return sources
+
     def interactive_mode(self):
         """Run in interactive mode for multiple queries."""
         print("\n" + "="*80)
@@ -234,8 +459,23 @@ Answer:"""
                     continue
 
                 print("\n🔍 Searching and generating answer...\n")
-                answer = self.query(question)
-                print(f"\n💡 Answer:\n{answer}\n")
+                streamed = []
+                
+                def print_token(token: str):
+                    if not streamed:
+                        print("\n💡 Answer:")
+                    streamed.append(token)
+                    print(token, end='', flush=True)
+                
+                answer = self.query(question, on_token=print_token)
+                if streamed:
+                    print("\n")
+                    # A stream that broke off returns the error instead of what was printed
+                    if answer != ''.join(streamed):
+                        print(f"❌ {answer}\n")
+                else:
+                    # Nothing was generated (no matching chunks or an LLM error)
+                    print(f"\n💡 Answer:\n{answer}\n")
 
             except KeyboardInterrupt:
                 print("\n\n👋 Goodbye!")
@@ -277,6 +517,9 @@ Examples:
 
   # Search only (no LLM answer)
   python3 query_memory.py "project deadline" --search-only
+
+  # Answer several questions at once (one per line)
+  python3 query_memory.py < questions.txt
         """
     )
 
@@ -298,14 +541,31 @@ Examples:
         logging.getLogger().setLevel(logging.DEBUG)
 
     # Initialize query system
-    query_system = MemoryQuery()
+    query_system = MemoryQuery(use_llm=not args.search_only)
 
     # Interactive mode
     if args.interactive:
         query_system.interactive_mode()
         return
 
-    # Single question mode
+    # Batch mode: one question per line on stdin
+    questions = []
+    if not args.question and not sys.stdin.isatty():
+        questions = [line.strip() for line in sys.stdin if line.strip()]
+    if questions:
+        if args.search_only:
+            results = query_system.search_embeddings(query_system.embed_queries(questions), top_k=args.top_k)
+            for question, chunks in zip(questions, results):
+                print(f"\n❓ {question}")
+                print_search_results(chunks)
+        else:
+            answers = query_system.query_batch(questions, show_sources=not args.no_sources)
+            for question, answer in zip(questions, answers):
+                print(f"\n❓ {question}")
+                print(f"\n💡 Answer:\n{answer}\n")
+        return
+
+    # Single question mode (also reached with empty or no piped input)
     if not args.question:
         parser.print_help()
         print("\n❌ Error: Please provide a question or use --interactive mode")
@@ -313,26 +573,28 @@ Examples:
 
     if args.search_only:
         # Search only mode
-        chunks = query_system.search(args.question, top_k=args.top_k)
-
-        if not chunks:
-            print("\n❌ No relevant information found.")
-            return
-
-        print(f"\n✅ Found {len(chunks)} relevant chunk(s):\n")
-        for i, chunk in enumerate(chunks, 1):
-            metadata = chunk['metadata']
-            print(f"[{i}] Recording: {metadata.get('recordingId', 'Unknown')}")
-            print(f"    Date: {metadata.get('startedAt', 'Unknown')}")
-            print(f"    Similarity: {chunk['similarity']:.2%}")
-            print(f"    Text: {chunk['text'][:200]}...")
-            print()
+        print_search_results(query_system.search(args.question, top_k=args.top_k))
     else:
         # Full query mode with LLM
         answer = query_system.query(args.question, show_sources=not args.no_sources)
         print(f"\n💡 Answer:\n{answer}\n")
 
 
+def print_search_results(chunks: List[Dict]):
+    """Print search-only results."""
+    if not chunks:
+        print("\n❌ No relevant information found.")
+        return
+
+    print(f"\n✅ Found {len(chunks)} relevant chunk(s):\n")
+    for i, chunk in enumerate(chunks, 1):
+        metadata = chunk['metadata']
+        print(f"[{i}] Recording: {metadata.get('recordingId', 'Unknown')}")
+        print(f"    Date: {metadata.get('startedAt', 'Unknown')}")
+        print(f"    Similarity: {chunk['similarity']:.2%}")
+        print(f"    Text: {chunk['text'][:200]}...")
+        print()
+
 if __name__ == '__main__':
     main()
 
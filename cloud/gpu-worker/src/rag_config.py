@@ -15,8 +15,10 @@ RAG_CONFIG = {
     'rem_home': REM_HOME,
     'transcripts_dir': REM_HOME / 'transcripts',
     'chroma_dir': REM_HOME / 'chroma',
-    'metadata_file': REM_HOME / 'sync_metadata.json',
+    'sync_db': REM_HOME / 'sync_metadata.db',
+    'metadata_file': REM_HOME / 'sync_metadata.json',  # Legacy sync state, imported into sync_db
     'config_file': REM_HOME / 'config.json',
+    'query_cache_file': REM_HOME / 'query_embed_cache.npz',
     
     # Embedding model
     'embedding_model': 'sentence-transformers/all-MiniLM-L6-v2',
@@ -30,6 +32,15 @@ RAG_CONFIG = {
     # ChromaDB configuration
     'collection_name': 'rem_transcripts',
     'distance_metric': 'cosine',
+    # HNSW build parameters; these only take effect when a collection is created
+    'hnsw_params': {
+        'hnsw:construction_ef': 200,
+        'hnsw:M': 32,
+        'hnsw:search_ef': 100,
+        'hnsw:batch_size': 1024,  # Matches add_batch_size
+        'hnsw:sync_threshold': 2048,  # Must be >= hnsw:batch_size
+        'hnsw:num_threads': os.cpu_count() or 1,
+    },
     
     # Chunking configuration
     'chunk_size': 500,  # words per chunk
@@ -38,10 +49,16 @@ RAG_CONFIG = {
     # Query configuration
     'top_k_results': 5,  # Number of chunks to retrieve
     'min_similarity': 0.3,  # Minimum similarity score (0-1)
+    'query_cache_size': 1024,  # Query embeddings kept in memory (and across restarts)
     
     # Performance
-    'batch_size': 32,  # Batch size for embedding generation
-    'device': 'mps' if os.getenv('WHISPER_DEVICE') == 'mps' else 'cpu',  # Use MPS if available
+    'batch_size': 128,  # Batch size for embedding generation
+    'add_batch_size': 1024,  # Chunks per ChromaDB add/get call
+    'index_workers': os.cpu_count() or 1,  # Processes used to parse and chunk transcripts
+    'index_pool_min_files': 32,  # Fewer files than this are parsed in-process
+    # Match the worker's accelerator if set, otherwise let sentence-transformers pick cuda/mps/cpu
+    'device': os.getenv('WHISPER_DEVICE') if os.getenv('WHISPER_DEVICE') in ('cuda', 'mps', 'cpu') else None,
+    'embedding_fp16': True,  # Run the embedding model in half precision on CUDA
 }
 
 # Ensure directories exist
@@ -51,6 +68,13 @@ def ensure_directories():
         path = RAG_CONFIG[key]
         path.mkdir(parents=True, exist_ok=True)
 
+def get_collection_metadata():
+    """ChromaDB collection metadata (distance metric and HNSW parameters)."""
+    return {
+        'hnsw:space': RAG_CONFIG['distance_metric'],
+        **RAG_CONFIG['hnsw_params'],
+    }
+
 # System prompts for LLM
 SYSTEM_PROMPTS = {
     'query': """You are a helpful AI assistant that answers questions based on the user's past voice recordings and transcriptions.
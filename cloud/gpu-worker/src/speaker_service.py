@@ -9,29 +9,70 @@ Handles:
 """
 
 import os
+import time
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
 from decimal import Decimal
 
 import boto3
 import numpy as np
+from boto3.dynamodb.types import Binary
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger('rem-worker.speaker')
 
-# AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION', 'us-east-1'))
 SPEAKERS_TABLE = os.getenv('SPEAKERS_TABLE', 'rem-speakers-dev')
+SPEAKERS_CACHE_TTL = float(os.getenv('SPEAKERS_CACHE_TTL', '60'))
+DIARIZATION_DEVICE = os.getenv('DIARIZATION_DEVICE', os.getenv('WHISPER_DEVICE', 'auto'))
+
+# DynamoDB table (lazy loaded, so importing this module doesn't build a boto3 resource)
+_speakers_table = None
+
+# Speaker profiles per user: user_id -> (loaded_at, profiles)
+_speakers_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
 
 # Embedding model (lazy loaded)
 _embedding_model = None
 
 
+def resolve_torch_device(device: str) -> str:
+    """Resolve 'auto' to the best available PyTorch device: cuda, mps, then cpu."""
+    if device != 'auto':
+        return device
+    try:
+        import torch
+    except ImportError:
+        return 'cpu'
+    if torch.cuda.is_available():
+        return 'cuda'
+    if torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+def get_speakers_table():
+    """Lazy load the speakers DynamoDB table."""
+    global _speakers_table
+    if _speakers_table is None:
+        dynamodb = boto3.resource(
+            'dynamodb',
+            region_name=os.getenv('AWS_REGION', 'us-east-1'),
+            config=Config(
+                max_pool_connections=32,
+                retries={'max_attempts': 3, 'mode': 'adaptive'}
+            )
+        )
+        _speakers_table = dynamodb.Table(SPEAKERS_TABLE)
+    return _speakers_table
+
+
 def get_embedding_model():
     """Lazy load the speaker embedding model."""
     global _embedding_model
     if _embedding_model is None:
         try:
+            import torch
             from pyannote.audio import Model, Inference
             logger.info("Loading speaker embedding model...")
             _embedding_model = Inference(
@@ -39,7 +80,8 @@ def get_embedding_model():
                     "pyannote/embedding",
                     use_auth_token=os.getenv('HUGGINGFACE_TOKEN')
                 ),
-                window="whole"
+                window="whole",
+                device=torch.device(resolve_torch_device(DIARIZATION_DEVICE))
             )
             logger.info("Speaker embedding model loaded successfully")
         except Exception as e:
@@ -48,45 +90,107 @@ def get_embedding_model():
     return _embedding_model
 
 
-def extract_speaker_embedding(audio_path: str, start: float, end: float) -> Optional[List[float]]:
-    """Extract voice embedding for a specific segment of audio."""
+def extract_speaker_embeddings(
+    audio_path: Union[str, BinaryIO, Dict[str, Any]],
+    spans: List[Tuple[float, float]]
+) -> List[Optional[List[float]]]:
+    """
+    Extract voice embeddings for several segments of the same audio file.
+    
+    The file is decoded once and every segment is cropped from the in-memory
+    waveform, instead of re-reading the file for each segment.
+    """
     model = get_embedding_model()
     if model is None:
-        return None
+        return [None] * len(spans)
     
     try:
         from pyannote.core import Segment
-        segment = Segment(start, end)
-        embedding = model.crop(audio_path, segment)
-        return embedding.tolist()
+        waveform, sample_rate = model.model.audio(audio_path)
+        audio = {'waveform': waveform, 'sample_rate': sample_rate}
     except Exception as e:
-        logger.error(f"Failed to extract speaker embedding: {e}")
-        return None
+        logger.error(f"Failed to load audio for speaker embeddings: {e}")
+        return [None] * len(spans)
+    
+    embeddings = []
+    for start, end in spans:
+        try:
+            embeddings.append(model.crop(audio, Segment(start, end)).tolist())
+        except Exception as e:
+            logger.error(f"Failed to extract speaker embedding: {e}")
+            embeddings.append(None)
+    
+    return embeddings
+
+
+def encode_embedding(embedding: List[float]) -> Tuple[bytes, Decimal]:
+    """
+    Quantize an embedding to int8 for a DynamoDB Binary attribute.
+    
+    Returns the packed bytes and the per-embedding scale that restores them.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32)
+    scale = float(np.abs(embedding).max()) / 127.0 or 1.0
+    quantized = np.round(embedding / scale).astype(np.int8)
+    return quantized.tobytes(), Decimal(str(scale))
+
 
+def decode_embedding(value: Any, scale: Optional[Decimal] = None) -> np.ndarray:
+    """
+    Unpack a stored embedding as float32.
+    
+    Handles int8 bytes with a scale, float32 bytes without one, and the legacy
+    list of Decimals.
+    """
+    if isinstance(value, Binary):
+        value = value.value
+    if isinstance(value, (bytes, bytearray)):
+        if scale is not None:
+            return np.frombuffer(value, dtype=np.int8).astype(np.float32) * float(scale)
+        return np.frombuffer(value, dtype=np.float32)
+    return np.array(value, dtype=np.float32)
 
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    """Calculate cosine similarity between two embeddings."""
-    a_np = np.array(a)
-    b_np = np.array(b)
-    return float(np.dot(a_np, b_np) / (np.linalg.norm(a_np) * np.linalg.norm(b_np)))
+
+def normalize_embedding(embedding: Any) -> np.ndarray:
+    """Scale an embedding to unit length, so cosine similarity is a plain dot product."""
+    embedding = np.asarray(embedding, dtype=np.float32)
+    return embedding / (np.linalg.norm(embedding) + 1e-12)
 
 
 def get_user_speakers(user_id: str) -> List[Dict[str, Any]]:
-    """Get all speaker profiles for a user."""
+    """
+    Get all speaker profiles for a user.
+    
+    Profiles are cached for SPEAKERS_CACHE_TTL seconds; save_speaker() drops
+    the user's entry, so the worker's own updates are seen immediately.
+    """
+    cached = _speakers_cache.get(user_id)
+    if cached and time.monotonic() - cached[0] < SPEAKERS_CACHE_TTL:
+        # Copies, so callers can update profiles without touching the cache
+        return [dict(speaker) for speaker in cached[1]]
+    
     try:
-        table = dynamodb.Table(SPEAKERS_TABLE)
+        table = get_speakers_table()
         response = table.query(
             KeyConditionExpression='userId = :uid',
             ExpressionAttributeValues={':uid': user_id}
         )
         speakers = response.get('Items', [])
         
-        # Convert Decimal embeddings back to float
+        # Embeddings are stored as int8 bytes plus a scale; older profiles hold float32
+        # bytes or a list of Decimals
         for speaker in speakers:
             if 'embedding' in speaker:
-                speaker['embedding'] = [float(x) for x in speaker['embedding']]
+                speaker['embedding'] = decode_embedding(speaker['embedding'], speaker.get('embScale'))
+                # Unquantized unit-length profiles can be matched as they are; the rest
+                # (quantized or older profiles) are normalized once here, not per match
+                if speaker.get('normalized') and 'embScale' not in speaker:
+                    speaker['embedding_n'] = speaker['embedding']
+                else:
+                    speaker['embedding_n'] = normalize_embedding(speaker['embedding'])
         
-        return speakers
+        _speakers_cache[user_id] = (time.monotonic(), speakers)
+        return [dict(speaker) for speaker in speakers]
     except ClientError as e:
         logger.error(f"Failed to get speakers: {e}")
         return []
@@ -101,7 +205,7 @@ def save_speaker(
 ) -> bool:
     """Save or update a speaker profile."""
     try:
-        table = dynamodb.Table(SPEAKERS_TABLE)
+        table = get_speakers_table()
         
         item = {
             'userId': user_id,
@@ -111,8 +215,9 @@ def save_speaker(
             'createdAt': boto3.dynamodb.conditions.Attr('createdAt').not_exists(),
         }
         
-        if embedding:
-            item['embedding'] = [Decimal(str(x)) for x in embedding]
+        if embedding is not None:
+            # Stored unit-length and quantized to int8 (a quarter of the float32 size)
+            item['embedding'], item['embScale'] = encode_embedding(normalize_embedding(embedding))
         
         # Use update to handle both create and update
         update_parts = ['#name = :name', 'sampleCount = :count', 'updatedAt = :now']
@@ -123,13 +228,18 @@ def save_speaker(
             ':now': boto3.dynamodb.conditions.Attr('updatedAt').not_exists()
         }
         
-        if embedding:
+        if embedding is not None:
             update_parts.append('embedding = :emb')
-            attr_values[':emb'] = [Decimal(str(x)) for x in embedding]
+            update_parts.append('embScale = :scale')
+            update_parts.append('normalized = :normalized')
+            attr_values[':emb'] = item['embedding']
+            attr_values[':scale'] = item['embScale']
+            attr_values[':normalized'] = True
         
         from datetime import datetime
         attr_values[':now'] = datetime.utcnow().isoformat() + 'Z'
         
+        _speakers_cache.pop(user_id, None)
         table.update_item(
             Key={'userId': user_id, 'speakerId': speaker_id},
             UpdateExpression='SET ' + ', '.join(update_parts) + 
@@ -145,59 +255,70 @@ def save_speaker(
         return False
 
 
-def update_speaker_embedding(
-    user_id: str,
-    speaker_id: str,
+def running_average_embedding(
     new_embedding: List[float],
     current_embedding: Optional[List[float]] = None,
     current_sample_count: int = 0
-) -> bool:
-    """Update speaker embedding with running average."""
-    if current_embedding and current_sample_count > 0:
-        # Calculate running average
+) -> Tuple[np.ndarray, int]:
+    """
+    Fold a new sample into a speaker's average embedding. Returns (embedding, sample_count).
+    
+    Both embeddings are averaged as unit vectors and the result is renormalized,
+    so every sample carries the same weight whatever its magnitude.
+    """
+    if current_embedding is not None and current_sample_count > 0:
+        # Calculate running average over the whole vector at once
+        # (DynamoDB returns sampleCount as a Decimal)
+        current_sample_count = int(current_sample_count)
         new_count = current_sample_count + 1
-        avg_embedding = [
-            (current_embedding[i] * current_sample_count + new_embedding[i]) / new_count
-            for i in range(len(new_embedding))
-        ]
+        current = normalize_embedding(current_embedding)
+        new = normalize_embedding(new_embedding)
+        avg_embedding = normalize_embedding((current * current_sample_count + new) / new_count)
     else:
-        avg_embedding = new_embedding
+        avg_embedding = normalize_embedding(new_embedding)
         new_count = 1
     
-    return save_speaker(user_id, speaker_id, embedding=avg_embedding, sample_count=new_count)
+    return avg_embedding, new_count
 
 
 def match_speaker(
     user_id: str,
     embedding: List[float],
-    threshold: float = 0.75
+    threshold: float = 0.75,
+    speakers: Optional[List[Dict[str, Any]]] = None
 ) -> Tuple[Optional[str], Optional[str], float]:
     """
     Match an embedding against known speakers.
     
+    Args:
+        speakers: The user's speaker profiles, if already loaded (skips the DynamoDB query)
+    
     Returns:
         Tuple of (speaker_id, speaker_name, similarity_score)
         Returns (None, None, 0.0) if no match found above threshold
     """
-    speakers = get_user_speakers(user_id)
+    if speakers is None:
+        speakers = get_user_speakers(user_id)
     
     if not speakers:
         return None, None, 0.0
     
-    best_match = None
-    best_name = None
-    best_score = 0.0
+    candidates = [speaker for speaker in speakers if 'embedding' in speaker]
+    if not candidates:
+        logger.info("No speaker match found (best score: 0.000)")
+        return None, None, 0.0
+    
+    # Score every profile at once with one matrix-vector product over unit vectors
+    profiles = np.stack([
+        speaker['embedding_n'] if 'embedding_n' in speaker else normalize_embedding(speaker['embedding'])
+        for speaker in candidates
+    ])
+    scores = profiles @ normalize_embedding(embedding)
     
-    for speaker in speakers:
-        if 'embedding' not in speaker:
-            continue
-        
-        similarity = cosine_similarity(embedding, speaker['embedding'])
-        
-        if similarity > best_score:
-            best_score = similarity
-            best_match = speaker['speakerId']
-            best_name = speaker.get('name', speaker['speakerId'])
+    best_index = int(scores.argmax())
+    best_score = max(float(scores[best_index]), 0.0)
+    best_match = candidates[best_index]['speakerId']
+    best_name = candidates[best_index].get('name', best_match)
     
     if best_score >= threshold:
         logger.info(f"Matched speaker {best_name} with similarity {best_score:.3f}")
@@ -208,7 +329,7 @@ def match_speaker(
 
 
 def identify_speakers_in_recording(
-    audio_path: str,
+    audio_path: Union[str, BinaryIO, Dict[str, Any]],
     user_id: str,
     speaker_segments: List[Dict[str, Any]],
     transcript_segments: List[Dict[str, Any]]
@@ -217,7 +338,8 @@ def identify_speakers_in_recording(
     Identify speakers in a recording and update profiles.
     
     Args:
-        audio_path: Path to audio file
+        audio_path: Path to audio file, a file-like object holding the audio, or
+            an in-memory {'waveform', 'sample_rate'} dict
         user_id: User ID for speaker profiles
         speaker_segments: Diarization output with speaker labels
         transcript_segments: Transcript segments with speaker assignments
@@ -229,51 +351,62 @@ def identify_speakers_in_recording(
     if not speaker_segments:
         return transcript_segments, {}
     
-    # Get unique speakers from diarization
-    unique_speakers = list(set(seg['speaker'] for seg in speaker_segments))
-    logger.info(f"Identifying {len(unique_speakers)} speakers...")
+    # Find each speaker's longest segment in a single pass over the diarization
+    longest_by_speaker = {}
+    for seg in speaker_segments:
+        duration = seg['end'] - seg['start']
+        current = longest_by_speaker.get(seg['speaker'])
+        if current is None or duration > current[0]:
+            longest_by_speaker[seg['speaker']] = (duration, seg)
+    logger.info(f"Identifying {len(longest_by_speaker)} speakers...")
     
     # Extract embedding for each speaker (use longest segment)
-    speaker_embeddings = {}
-    for speaker in unique_speakers:
-        # Find longest segment for this speaker
-        speaker_segs = [s for s in speaker_segments if s['speaker'] == speaker]
-        if not speaker_segs:
-            continue
-        
-        longest = max(speaker_segs, key=lambda s: s['end'] - s['start'])
-        duration = longest['end'] - longest['start']
-        
+    speaker_spans = {
+        speaker: (longest['start'], longest['end'])
+        for speaker, (duration, longest) in longest_by_speaker.items()
         # Only extract if segment is long enough (at least 2 seconds)
-        if duration >= 2.0:
-            embedding = extract_speaker_embedding(audio_path, longest['start'], longest['end'])
-            if embedding:
-                speaker_embeddings[speaker] = embedding
+        if duration >= 2.0
+    }
+    
+    embeddings = extract_speaker_embeddings(audio_path, list(speaker_spans.values()))
+    speaker_embeddings = {
+        speaker: embedding
+        for speaker, embedding in zip(speaker_spans, embeddings)
+        if embedding is not None
+    }
     
-    # Match each speaker against known profiles
+    # Match each speaker against known profiles. Profiles are loaded once and kept
+    # current in memory, so later speakers see the profiles added or updated here.
+    speakers = get_user_speakers(user_id)
+    speakers_by_id = {speaker['speakerId']: speaker for speaker in speakers}
     speaker_mapping = {}  # Maps temp ID -> (persistent_id, name)
     
     for temp_id, embedding in speaker_embeddings.items():
-        matched_id, matched_name, score = match_speaker(user_id, embedding)
+        matched_id, matched_name, score = match_speaker(user_id, embedding, speakers=speakers)
         
         if matched_id:
             # Found a match - update the profile with new sample
             speaker_mapping[temp_id] = (matched_id, matched_name)
             
             # Get current speaker data for running average
-            speakers = get_user_speakers(user_id)
-            current = next((s for s in speakers if s['speakerId'] == matched_id), None)
-            
-            if current:
-                update_speaker_embedding(
-                    user_id, matched_id, embedding,
-                    current.get('embedding'),
-                    current.get('sampleCount', 0)
-                )
+            current = speakers_by_id[matched_id]
+            avg_embedding, new_count = running_average_embedding(
+                embedding,
+                current.get('embedding'),
+                current.get('sampleCount', 0)
+            )
+            if save_speaker(user_id, matched_id, embedding=avg_embedding, sample_count=new_count):
+                current['embedding'] = current['embedding_n'] = avg_embedding
+                current['sampleCount'] = new_count
         else:
             # New speaker - create profile with temp ID
-            new_id = f"speaker_{len(get_user_speakers(user_id)) + 1}"
-            save_speaker(user_id, new_id, name=None, embedding=embedding)
+            new_id = f"speaker_{len(speakers) + 1}"
+            if save_speaker(user_id, new_id, name=None, embedding=embedding):
+                unit = normalize_embedding(embedding)
+                profile = {'userId': user_id, 'speakerId': new_id, 'name': new_id,
+                           'embedding': unit, 'embedding_n': unit, 'sampleCount': 1}
+                speakers.append(profile)
+                speakers_by_id[new_id] = profile
             speaker_mapping[temp_id] = (new_id, new_id)
     
     # Update transcript segments with persistent speaker IDs
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+REM Transcript Preparation
+Loads and chunks transcripts for the indexer.
+
+Kept free of the embedding model and ChromaDB so the indexer's worker
+processes, which import this module, start quickly.
+"""
+
+import gzip
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from rag_config import RAG_CONFIG, TRANSCRIPT_METADATA_FIELDS
+
+logger = logging.getLogger('indexer.prep')
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def chunk_transcript(transcript: Dict) -> List[Dict]:
+    """
+    Split transcript into semantic chunks.
+    
+    Args:
+        transcript: Transcript JSON object
+        
+    Returns:
+        List of chunks with text and metadata
+    """
+    chunks = []
+    segments = transcript.get('segments', [])
+    
+    if not segments:
+        logger.warning(f"No segments found in transcript {transcript.get('recordingId')}")
+        return chunks
+    
+    # Tokenize each segment once: the word count both filters out empty
+    # segments and drives chunk sizing
+    segment_words = []
+    for segment in segments:
+        text = segment.get('text', '')
+        word_count = len(text.split())
+        if word_count:
+            segment_words.append((segment, text, word_count))
+    
+    if not segment_words:
+        return chunks
+    
+    segments = [segment for segment, _, _ in segment_words]
+    # Texts are pulled out once so each chunk joins a slice directly
+    texts = [text for _, text, _ in segment_words]
+    
+    # Cumulative word counts let each chunk boundary be found with a binary
+    # search instead of re-counting words segment by segment
+    cumulative = np.cumsum(
+        np.fromiter((count for _, _, count in segment_words), dtype=np.int64, count=len(segment_words))
+    )
+    chunk_size = RAG_CONFIG['chunk_size']
+    overlap = RAG_CONFIG['chunk_overlap']
+    
+    start = 0
+    chunk_index = 0
+    carried_overlap = False
+    while start < len(segments):
+        words_before = cumulative[start - 1] if start > 0 else 0
+        # First segment at which the chunk reaches chunk_size words; a chunk
+        # that starts with an overlap segment always takes at least one more
+        end = int(np.searchsorted(cumulative, words_before + chunk_size, side='left'))
+        if carried_overlap:
+            end = max(end, start + 1)
+        final = end >= len(segments)
+        if final:
+            # Add remaining segments as final chunk
+            end = len(segments) - 1
+        
+        current_chunk = segments[start:end + 1]
+        chunks.append({
+            'text': ' '.join(texts[start:end + 1]),
+            'chunk_index': chunk_index,
+            'start_time': current_chunk[0].get('start', 0),
+            'end_time': current_chunk[-1].get('end', 0),
+            'word_count': int(cumulative[end] - words_before)
+        })
+        chunk_index += 1
+        
+        if final:
+            break
+        
+        # Start new chunk with overlap (keep last segment)
+        carried_overlap = overlap > 0 and end > start
+        start = end if carried_overlap else end + 1
+    
+    return chunks
+
+
+def extract_metadata(transcript: Dict) -> Dict:
+    """
+    Extract transcript-level metadata.
+    
+    These fields are identical for every chunk of a transcript, so they are
+    computed once and merged into each chunk's row by chunk_metadatas.
+    """
+    metadata = {}
+    
+    # Extract transcript-level metadata
+    for field in TRANSCRIPT_METADATA_FIELDS:
+        if field in transcript:
+            value = transcript[field]
+            # Convert to string for ChromaDB compatibility
+            metadata[field] = str(value) if value is not None else ''
+    
+    # Add full text if available (for context)
+    if 'fullText' in transcript:
+        metadata['full_text_preview'] = transcript['fullText'][:200]
+    
+    # Add AI enhancements if available
+    if 'summary' in transcript:
+        metadata['summary'] = transcript['summary'][:500]
+    if 'topics' in transcript and transcript['topics']:
+        metadata['topics'] = ', '.join(transcript['topics'][:5])
+    
+    return metadata
+
+
+def prepare_transcript(transcript_path: Path) -> Optional[Dict]:
+    """
+    Load and chunk a transcript file without touching the index.
+    
+    This is CPU-bound pure Python and needs neither the embedding model
+    nor ChromaDB, so it can run in worker processes.
+    
+    Args:
+        transcript_path: Path to transcript JSON file
+        
+    Returns:
+        Dict with recording_id, ids, texts, the shared transcript metadata
+        and per-chunk metadata columns, or None if the transcript could
+        not be chunked
+    """
+    try:
+        data = transcript_path.read_bytes()
+        # The worker uploads transcripts gzip-compressed and the sync
+        # keeps S3's bytes as-is (its ETag check hashes the local file)
+        if data[:2] == GZIP_MAGIC:
+            data = gzip.decompress(data)
+        return prepare_transcript_data(orjson.loads(data), str(transcript_path))
+    
+    except Exception as e:
+        logger.error(f"Failed to prepare {transcript_path}: {e}")
+        return None
+
+
+def prepare_transcript_data(transcript: Dict, source: str = 'transcript') -> Optional[Dict]:
+    """
+    Chunk an already-loaded transcript without touching the index.
+    
+    Args:
+        transcript: Transcript data as stored in S3
+        source: Where the transcript came from, for log messages
+        
+    Returns:
+        Same as prepare_transcript
+    """
+    try:
+        recording_id = transcript.get('recordingId')
+        if not recording_id:
+            logger.warning(f"No recordingId in {source}")
+            return None
+        
+        # Chunk the transcript
+        chunks = chunk_transcript(transcript)
+        
+        if not chunks:
+            logger.warning(f"No chunks created for {recording_id}")
+            return None
+        
+        return {
+            'recording_id': recording_id,
+            'ids': [f"{recording_id}_chunk_{chunk['chunk_index']}" for chunk in chunks],
+            'texts': [chunk['text'] for chunk in chunks],
+            'metadata': extract_metadata(transcript),
+            'chunk_columns': {
+                field: [chunk[field] for chunk in chunks]
+                for field in ('chunk_index', 'start_time', 'end_time', 'word_count')
+            }
+        }
+    
+    except Exception as e:
+        logger.error(f"Failed to prepare {source}: {e}")
+        return None
@@ -6,24 +6,35 @@ Polls SQS for transcription jobs, downloads audio from S3,
 transcribes using Whisper, and stores results back to S3 and DynamoDB.
 """
 
+import io
 import os
 import sys
-import json
+import gc
+import gzip
+import base64
+import hashlib
 import time
-import tempfile
 import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, List, Optional, Any
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
 import boto3
+import httpx
+import numpy as np
+import orjson
+from boto3.dynamodb.types import Binary
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from faster_whisper import WhisperModel
+from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import BadRequestError, OpenAI
 
-from speaker_service import identify_speakers_in_recording
+from speaker_service import identify_speakers_in_recording, resolve_torch_device
 
 # Load environment variables from parent directory
 # This ensures .env is found whether running from src/ or gpu-worker/
@@ -37,29 +48,99 @@ logging.basicConfig(
 )
 logger = logging.getLogger('rem-worker')
 
+MB = 1024 * 1024
+
+# Audio downloads above the threshold are split into parallel ranged GETs;
+# the S3 client's pool has to cover every transfer thread (plus the prefetch
+# download running alongside), otherwise threads queue for a connection.
+S3_DOWNLOAD_CONCURRENCY = 20
+s3_transfer_config = TransferConfig(
+    multipart_threshold=8 * MB,
+    multipart_chunksize=16 * MB,
+    max_concurrency=S3_DOWNLOAD_CONCURRENCY,
+    use_threads=True
+)
+
 # AWS clients
-s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+s3_client = boto3.client(
+    's3',
+    region_name=os.getenv('AWS_REGION', 'us-east-1'),
+    config=Config(max_pool_connections=S3_DOWNLOAD_CONCURRENCY * 2)
+)
 sqs_client = boto3.client('sqs', region_name=os.getenv('AWS_REGION', 'us-east-1'))
 dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION', 'us-east-1'))
 
 # OpenAI client
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# One pooled HTTP/2 connection carries the concurrent summary, topic and
+# embedding requests for every message, so the TLS handshake is paid once
+openai_http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    timeout=60.0
+)
+openai_client = OpenAI(api_key=OPENAI_API_KEY, http_client=openai_http_client) if OPENAI_API_KEY else None
+# Loaded on first use by get_tokenizer()
+tokenizer = None
+
+# OpenAI enhancements (summary, topics, embeddings) are independent network
+# calls, and the next message's audio download only needs S3; both run in
+# the background while the GPU transcribes and diarizes.
+enhancement_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rem-openai')
+prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rem-prefetch')
+# Diarization only needs the audio, so it runs alongside Whisper: CTranslate2
+# and PyTorch both release the GIL while their kernels run
+diarization_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rem-diarize')
+# Uploads, indexing and DynamoDB updates for recordings already off the GPU
+finish_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IO_WORKERS', '4')),
+    thread_name_prefix='rem-finish'
+)
+# The local RAG index is a single Chroma store; index one transcript at a time.
+# rag_indexer is loaded on first use (False if the RAG system isn't installed).
+index_lock = threading.Lock()
+rag_indexer = None
 
 # Pyannote.audio for speaker diarization
 HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_TOKEN')
+DIARIZATION_DEVICE = resolve_torch_device(
+    os.getenv('DIARIZATION_DEVICE', os.getenv('WHISPER_DEVICE', 'auto'))
+)
+# Mixed precision and torch.compile only pay off on the GPU
+DIARIZATION_FP16 = (
+    os.getenv('DIARIZATION_FP16', 'true').lower() == 'true'
+    and DIARIZATION_DEVICE.startswith('cuda')
+)
+DIARIZATION_COMPILE = (
+    os.getenv('DIARIZATION_COMPILE', 'true').lower() == 'true'
+    and DIARIZATION_DEVICE.startswith('cuda')
+)
 diarization_pipeline = None
 
 if HUGGINGFACE_TOKEN:
     try:
+        import torch
         from pyannote.audio import Pipeline
         diarization_pipeline = Pipeline.from_pretrained(
             "pyannote/speaker-diarization-3.1",
             use_auth_token=HUGGINGFACE_TOKEN
         )
-        logger.info("Speaker diarization pipeline loaded successfully")
+        # Pyannote pipelines load on the CPU; run segmentation and embedding on the GPU
+        diarization_pipeline.to(torch.device(DIARIZATION_DEVICE))
+        # Sliding-window inference feeds fixed-size chunks, so cuDNN's
+        # autotuned kernels are reused across recordings
+        torch.backends.cudnn.benchmark = True
+        if DIARIZATION_COMPILE:
+            # Compile the segmentation network's forward in place, so the
+            # pipeline keeps its own Model object; compiled on the warm-up pass
+            try:
+                segmentation_model = diarization_pipeline._segmentation.model
+                segmentation_model.forward = torch.compile(segmentation_model.forward)
+            except Exception as e:
+                logger.warning("Could not compile diarization segmentation model: %s", e)
+        logger.info("Speaker diarization pipeline loaded successfully on %s", DIARIZATION_DEVICE)
     except Exception as e:
-        logger.warning(f"Failed to load speaker diarization pipeline: {e}")
+        logger.warning("Failed to load speaker diarization pipeline: %s", e)
         diarization_pipeline = None
 else:
     logger.warning("HuggingFace token not configured, speaker diarization disabled")
@@ -70,23 +151,102 @@ RAW_AUDIO_BUCKET = os.getenv('RAW_AUDIO_BUCKET')
 TRANSCRIPTS_BUCKET = os.getenv('TRANSCRIPTS_BUCKET')
 DYNAMODB_TABLE = os.getenv('DYNAMODB_TABLE')
 WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
-WHISPER_DEVICE = os.getenv('WHISPER_DEVICE', 'cuda')
-WHISPER_COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', 'float16')
+# 'auto' uses CUDA when CTranslate2 can see a GPU and falls back to the CPU
+WHISPER_DEVICE = os.getenv('WHISPER_DEVICE', 'auto')
+# 'auto' picks the best quantized type the device supports at startup
+WHISPER_COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', 'auto')
+# Preference order for 'auto': bf16 activations on Ampere and newer, fp16 on
+# older GPUs (e.g. T4), plain int8 on CPU
+WHISPER_COMPUTE_PREFERENCE = ['int8_bfloat16', 'int8_float16', 'int8', 'float32']
+WHISPER_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', '16'))
+# Greedy decoding by default instead of paying for beam search everywhere;
+# the batched pipeline decodes at temperature 0 only, with no fallback
+WHISPER_BEAM_SIZE = int(os.getenv('WHISPER_BEAM_SIZE', '1'))
+# Segments whose greedy average log-probability stays below the threshold are
+# re-decoded once with beam search (0 disables the retry)
+WHISPER_RETRY_BEAM_SIZE = int(os.getenv('WHISPER_RETRY_BEAM_SIZE', '5'))
+WHISPER_RETRY_LOGPROB = float(os.getenv('WHISPER_RETRY_LOGPROB', '-1.0'))
 POLL_INTERVAL = int(os.getenv('POLL_INTERVAL', '5'))
-MAX_MESSAGES = int(os.getenv('MAX_MESSAGES', '1'))
+SAMPLE_RATE = 16000  # Whisper's input rate; decoded audio is shared at this rate
 VISIBILITY_TIMEOUT = int(os.getenv('VISIBILITY_TIMEOUT', '900'))
 
+# Finished results keyed by audio content hash, so a redelivered message
+# (e.g. after a failed DynamoDB update) skips Whisper and the OpenAI calls.
+# Kept outside transcripts/ so the local sync doesn't index them. Each message
+# pays a SHA-256 of the audio plus one GET; an entry is only written when
+# storing fails, deleted once a retry stores it, and expired after 7 days by
+# the transcripts bucket lifecycle rule.
+RESULT_CACHE_PREFIX = '_cache/'
+
+# OpenAI embeddings accept up to 8191 tokens per input, and 2048 inputs and
+# 300k tokens per request; budgets leave headroom under each cap.
+EMBEDDING_MAX_TOKENS = 8000
+EMBEDDING_BATCH_SIZE = 2048
+EMBEDDING_BATCH_MAX_TOKENS = 250_000
+# Transcript text sent for the summary (~4000 characters of English)
+SUMMARY_MAX_TOKENS = 1000
+# Backchannel segments ("Yeah.", "Okay, sure.") give noisy vectors; they stay
+# in the transcript but aren't embedded
+SEGMENT_EMBEDDING_MIN_WORDS = int(os.getenv('SEGMENT_EMBEDDING_MIN_WORDS', '4'))
+
 # Validate configuration
 required_vars = [
     'SQS_QUEUE_URL', 'RAW_AUDIO_BUCKET', 'TRANSCRIPTS_BUCKET', 'DYNAMODB_TABLE'
 ]
 missing_vars = [var for var in required_vars if not os.getenv(var)]
 if missing_vars:
-    logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
+    logger.error("Missing required environment variables: %s", ', '.join(missing_vars))
     sys.exit(1)
 
+# Recordings table, resolved once rather than per message
+dynamo_table = dynamodb.Table(DYNAMODB_TABLE)
+
+
+
+def resolve_whisper_device(device: str) -> str:
+    """Resolve 'auto' to the device CTranslate2 should run Whisper on"""
+    if device == 'mps':
+        # CTranslate2 has no Metal backend; on Apple Silicon it runs on the CPU
+        logger.warning("Whisper can't run on mps, using cpu")
+        return 'cpu'
+    if device != 'auto':
+        return device
+
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            return 'cuda'
+    except Exception as e:
+        logger.warning("Could not query CUDA devices: %s", e)
+    return 'cpu'
+
+
+def resolve_compute_type(device: str, compute_type: str) -> str:
+    """Resolve 'auto' to the preferred compute type supported by the device"""
+    if compute_type != 'auto':
+        return compute_type
+
+    try:
+        import ctranslate2
+        supported = ctranslate2.get_supported_compute_types(device)
+    except Exception as e:
+        logger.warning("Could not query supported compute types for %s: %s", device, e)
+        return 'default'
+
+    for candidate in WHISPER_COMPUTE_PREFERENCE:
+        if candidate in supported:
+            return candidate
+    return 'default'
+
+
+WHISPER_DEVICE = resolve_whisper_device(WHISPER_DEVICE)
+WHISPER_COMPUTE_TYPE = resolve_compute_type(WHISPER_DEVICE, WHISPER_COMPUTE_TYPE)
+# A CPU worker takes one message at a time so the rest stay in the queue,
+# visible to the autoscaler and to other tasks
+MAX_MESSAGES = int(os.getenv('MAX_MESSAGES', '1' if WHISPER_DEVICE == 'cpu' else '10'))
+
 # Initialize Whisper model
-logger.info(f"Loading Whisper model: {WHISPER_MODEL} on {WHISPER_DEVICE}")
+logger.info("Loading Whisper model: %s on %s (%s)", WHISPER_MODEL, WHISPER_DEVICE, WHISPER_COMPUTE_TYPE)
 try:
     # Use HF_HOME from env or default to user's home directory
     cache_dir = os.getenv('HF_HOME') or os.path.expanduser('~/.cache/huggingface')
@@ -97,50 +257,116 @@ try:
         compute_type=WHISPER_COMPUTE_TYPE,
         download_root=cache_dir
     )
+    # Batch VAD-cut segments through the encoder/decoder in one GPU pass
+    batched_model = BatchedInferencePipeline(model=whisper_model)
     logger.info("Whisper model loaded successfully")
 except Exception as e:
-    logger.error(f"Failed to load Whisper model: {e}")
+    logger.error("Failed to load Whisper model: %s", e)
     sys.exit(1)
 
+# Warm up with silence so CUDA kernel selection and cuBLAS/allocator setup
+# happen at boot instead of on the first message. One full batch of 5 s clips
+# is passed as explicit clip timestamps, so VAD doesn't drop the silence and
+# the encoder sees the batch shape real recordings use.
+WARMUP_CLIP_SAMPLES = 5 * SAMPLE_RATE
+try:
+    warmup_segments, _ = batched_model.transcribe(
+        np.zeros(WARMUP_CLIP_SAMPLES * WHISPER_BATCH_SIZE, dtype=np.float32),
+        batch_size=WHISPER_BATCH_SIZE,
+        beam_size=WHISPER_BEAM_SIZE,
+        vad_filter=False,
+        clip_timestamps=[
+            {'start': i * WARMUP_CLIP_SAMPLES, 'end': (i + 1) * WARMUP_CLIP_SAMPLES}
+            for i in range(WHISPER_BATCH_SIZE)
+        ]
+    )
+    list(warmup_segments)
+    logger.info("Whisper model warmed up")
+except Exception as e:
+    logger.warning("Whisper warm-up failed: %s", e)
 
-def download_audio_from_s3(bucket: str, key: str, local_path: str) -> bool:
-    """Download audio file from S3 to local path."""
+if diarization_pipeline:
     try:
-        logger.info(f"Downloading s3://{bucket}/{key}")
-        s3_client.download_file(bucket, key, local_path)
-        logger.info(f"Downloaded to {local_path}")
-        return True
+        import torch
+        with torch.autocast('cuda', dtype=torch.float16, enabled=DIARIZATION_FP16):
+            diarization_pipeline({
+                'waveform': torch.zeros(1, WARMUP_CLIP_SAMPLES),
+                'sample_rate': SAMPLE_RATE
+            })
+        logger.info("Speaker diarization pipeline warmed up")
+    except Exception as e:
+        logger.warning("Speaker diarization warm-up failed: %s", e)
+
+
+def download_audio_from_s3(bucket: str, key: str) -> Optional[io.BytesIO]:
+    """Download audio file from S3 into memory."""
+    try:
+        logger.info("Downloading s3://%s/%s", bucket, key)
+        buf = io.BytesIO()
+        s3_client.download_fileobj(bucket, key, buf, Config=s3_transfer_config)
+        buf.seek(0)
+        logger.info("Downloaded %s bytes", buf.getbuffer().nbytes)
+        return buf
     except ClientError as e:
-        logger.error(f"Failed to download from S3: {e}")
-        return False
+        logger.error("Failed to download from S3: %s", e)
+        return None
 
 
-def transcribe_audio(audio_path: str) -> Optional[Dict[str, Any]]:
-    """Transcribe audio file using Whisper."""
+def decode_recording(audio: Union[str, BinaryIO]) -> np.ndarray:
+    """Decode audio once to 16 kHz mono float32 samples for every GPU stage."""
+    return decode_audio(audio, sampling_rate=SAMPLE_RATE)
+
+
+def as_pyannote_audio(samples: np.ndarray) -> Dict[str, Any]:
+    """Wrap decoded samples in the in-memory form pyannote accepts.
+
+    On CUDA the waveform is copied to the device once, from pinned memory, so
+    diarization and speaker embedding crop chunks already on the GPU instead
+    of each copying their own batches over.
+    """
+    import torch
+    waveform = torch.from_numpy(samples).unsqueeze(0)
+    device = torch.device(DIARIZATION_DEVICE)
+    if device.type == 'cuda':
+        waveform = waveform.pin_memory().to(device, non_blocking=True)
+    return {'waveform': waveform, 'sample_rate': SAMPLE_RATE}
+
+
+def transcribe_audio(audio: Union[str, BinaryIO, np.ndarray]) -> Optional[Dict[str, Any]]:
+    """Transcribe an audio file path, in-memory buffer or decoded samples using Whisper."""
     try:
-        logger.info(f"Transcribing {audio_path}")
+        logger.info("Transcribing audio")
         start_time = time.time()
         
-        segments, info = whisper_model.transcribe(
-            audio_path,
-            beam_size=5,
+        segments, info = batched_model.transcribe(
+            audio,
+            batch_size=WHISPER_BATCH_SIZE,
+            beam_size=WHISPER_BEAM_SIZE,
             vad_filter=True,  # Voice activity detection
             vad_parameters=dict(min_silence_duration_ms=500)
         )
         
-        # Convert segments to list
-        segment_list = []
-        full_text_parts = []
-        
-        for segment in segments:
-            segment_dict = {
+        # Drain the generator first so decoding runs batch after batch without
+        # Python dict building in between, then round all timestamps at once
+        segments = list(segments)
+        if isinstance(audio, np.ndarray):
+            full_text_parts = retry_low_confidence_segments(audio, segments)
+        else:
+            full_text_parts = [segment.text.strip() for segment in segments]
+        timestamps = np.round(
+            np.array([(segment.start, segment.end) for segment in segments], dtype=np.float64).reshape(-1, 2),
+            2
+        ).tolist()
+
+        segment_list = [
+            {
                 'id': segment.id,
-                'start': round(segment.start, 2),
-                'end': round(segment.end, 2),
-                'text': segment.text.strip()
+                'start': start,
+                'end': end,
+                'text': text
             }
-            segment_list.append(segment_dict)
-            full_text_parts.append(segment.text.strip())
+            for segment, (start, end), text in zip(segments, timestamps, full_text_parts)
+        ]
         
         duration = time.time() - start_time
         
@@ -154,113 +380,244 @@ def transcribe_audio(audio_path: str) -> Optional[Dict[str, Any]]:
             'whisper_model': WHISPER_MODEL
         }
         
-        logger.info(f"Transcription complete in {duration:.2f}s")
-        logger.info(f"Detected language: {info.language} ({info.language_probability:.2%})")
-        logger.info(f"Found {len(segment_list)} segments")
+        logger.info("Transcription complete in %.2fs", duration)
+        logger.info("Detected language: %s (%.2f%%)", info.language, info.language_probability * 100)
+        logger.info("Found %s segments", len(segment_list))
 
         return result
     except Exception as e:
-        logger.error(f"Transcription failed: {e}")
+        logger.error("Transcription failed: %s", e)
         return None
 
 
-def generate_embedding(text: str) -> Optional[List[float]]:
-    """Generate embedding for text using OpenAI."""
-    if not openai_client:
-        logger.warning("OpenAI client not configured, skipping embedding generation")
-        return None
+def retry_low_confidence_segments(samples: np.ndarray, segments: List[Any]) -> List[str]:
+    """Re-decode low-confidence segments with beam search.
 
+    Returns the text of every segment, taken from the beam search pass where
+    it scored better than the greedy pass.
+    """
+    texts = [segment.text.strip() for segment in segments]
+    if WHISPER_RETRY_BEAM_SIZE <= WHISPER_BEAM_SIZE:
+        return texts
+
+    low = [
+        i for i, segment in enumerate(segments)
+        if segment.avg_logprob < WHISPER_RETRY_LOGPROB and segment.end > segment.start
+    ]
+    if not low:
+        return texts
+
+    logger.info("Retrying %s low-confidence segment(s) with beam size %s", len(low), WHISPER_RETRY_BEAM_SIZE)
     try:
-        logger.info(f"Generating embedding for text ({len(text)} chars)")
-        response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text[:8000]  # Limit to ~8k chars to stay within token limits
+        retried, _ = batched_model.transcribe(
+            samples,
+            batch_size=WHISPER_BATCH_SIZE,
+            beam_size=WHISPER_RETRY_BEAM_SIZE,
+            vad_filter=False,
+            clip_timestamps=[
+                {
+                    'start': int(segments[i].start * SAMPLE_RATE),
+                    'end': int(segments[i].end * SAMPLE_RATE)
+                }
+                for i in low
+            ]
         )
-        embedding = response.data[0].embedding
-        logger.info(f"Generated embedding with {len(embedding)} dimensions")
-        return embedding
+        retried = list(retried)
     except Exception as e:
-        logger.error(f"Failed to generate embedding: {e}")
-        return None
+        logger.warning("Beam search retry failed: %s", e)
+        return texts
+
+    # Each retried segment belongs to the clip containing its midpoint
+    clip_starts = np.array([segments[i].start for i in low], dtype=np.float64)
+    parts: Dict[int, List[Any]] = {}
+    for segment in retried:
+        clip = int(np.searchsorted(clip_starts, (segment.start + segment.end) / 2, side='right')) - 1
+        parts.setdefault(max(clip, 0), []).append(segment)
+
+    for clip, clip_segments in parts.items():
+        i = low[clip]
+        text = ' '.join(segment.text.strip() for segment in clip_segments).strip()
+        avg_logprob = float(np.mean([segment.avg_logprob for segment in clip_segments]))
+        if text and avg_logprob > segments[i].avg_logprob:
+            texts[i] = text
+
+    return texts
+
+
+def get_tokenizer():
+    """Lazy-load the tiktoken encoding used to budget OpenAI inputs."""
+    global tokenizer
+    if tokenizer is None:
+        try:
+            import tiktoken
+            # cl100k_base is text-embedding-3's encoding; it never counts
+            # fewer tokens than gpt-4o-mini's o200k_base for the same text
+            tokenizer = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning("Failed to load tokenizer, budgeting by characters: %s", e)
+            tokenizer = False  # Mark as attempted
+    return tokenizer if tokenizer is not False else None
+
+
+def truncate_tokens(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Cut text to at most max_tokens tokens, returning it with its token count.
+
+    Without the tokenizer, characters stand in for tokens.
+    """
+    encoding = get_tokenizer()
+    if encoding is None:
+        text = text[:max_tokens]
+        return text, len(text)
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    return encoding.decode(tokens[:max_tokens]), max_tokens
+
+
+def generate_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """Generate embeddings for many texts using batched OpenAI requests.
 
+    Returns one entry per input text, in input order. Entries are None when
+    the text is empty or its batch failed. Repeated texts are embedded once.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
 
-def generate_summary(text: str) -> Optional[str]:
-    """Generate AI summary of transcript using OpenAI."""
     if not openai_client:
-        logger.warning("OpenAI client not configured, skipping summary generation")
-        return None
+        logger.warning("OpenAI client not configured, skipping embedding generation")
+        return results
+
+    # Cut each input to the per-input token limit, and send each distinct
+    # text once ("Thank you." recurs across a meeting)
+    positions: Dict[str, List[int]] = {}
+    token_counts: Dict[str, int] = {}
+    for i, text in enumerate(texts):
+        if text and text.strip():
+            text, token_count = truncate_tokens(text.strip(), EMBEDDING_MAX_TOKENS)
+            positions.setdefault(text, []).append(i)
+            token_counts[text] = token_count
+    inputs = list(positions)
+
+    # Split into requests that respect the API's per-request item and token caps
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    batch_tokens = 0
+    for text in inputs:
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or
+                      batch_tokens + token_counts[text] > EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += token_counts[text]
+    if batch:
+        batches.append(batch)
+
+    logger.info("Generating embeddings for %s distinct text(s) in %s request(s)", len(inputs), len(batches))
+
+    while batches:
+        batch = batches.pop(0)
+        try:
+            response = openai_client.embeddings.create(
+                model="text-embedding-3-small",
+                input=batch
+            )
+            for item in response.data:
+                for i in positions[batch[item.index]]:
+                    results[i] = item.embedding
+        except BadRequestError as e:
+            if len(batch) == 1:
+                logger.error("Failed to generate embedding: %s", e)
+                continue
+            # One rejected input shouldn't cost the rest of the batch
+            logger.warning("Embedding batch rejected, retrying its %s input(s) one at a time: %s", len(batch), e)
+            batches.extend([text] for text in batch)
+        except Exception as e:
+            logger.error("Failed to generate embeddings: %s", e)
+
+    return results
 
-    try:
-        logger.info(f"Generating summary for text ({len(text)} chars)")
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that summarizes voice recordings. "
-                               "Create a concise 2-3 sentence summary of the key points."
-                },
-                {
-                    "role": "user",
-                    "content": f"Summarize this transcript:\n\n{text[:4000]}"
-                }
-            ],
-            max_tokens=150,
-            temperature=0.3
-        )
-        summary = response.choices[0].message.content.strip()
-        logger.info(f"Generated summary: {summary[:100]}...")
-        return summary
-    except Exception as e:
-        logger.error(f"Failed to generate summary: {e}")
-        return None
+
+def pack_embedding(embedding: List[float]) -> str:
+    """
+    Pack an embedding as base64 little-endian float16 for transcript JSON.
+
+    A 1536-dim vector is ~4 KB this way instead of ~23 KB as a JSON list of
+    floats; float16 error is negligible for cosine similarity.
+    """
+    return base64.b64encode(np.asarray(embedding, dtype='<f2').tobytes()).decode('ascii')
+
+
+def unpack_embedding(value: Any) -> List[float]:
+    """Unpack an embedding stored by this worker (packed string, bytes, or legacy list)."""
+    if isinstance(value, Binary):
+        value = value.value
+    elif isinstance(value, str):
+        value = base64.b64decode(value)
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype='<f2').astype(np.float32).tolist()
+    return [float(f) for f in value]
 
 
-def extract_topics(text: str) -> Optional[List[str]]:
-    """Extract topics from transcript using OpenAI."""
+def generate_summary_and_topics(text: str) -> Tuple[Optional[str], Optional[List[str]]]:
+    """Generate an AI summary and key topics of a transcript in one OpenAI call."""
     if not openai_client:
-        logger.warning("OpenAI client not configured, skipping topic extraction")
-        return None
+        logger.warning("OpenAI client not configured, skipping summary and topic extraction")
+        return None, None
 
     try:
-        logger.info(f"Extracting topics from text ({len(text)} chars)")
+        logger.info("Generating summary and topics for text (%s chars)", len(text))
         response = openai_client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a helpful assistant that extracts key topics from voice recordings. "
-                               "Return ONLY a comma-separated list of 3-5 single-word or short-phrase topics. "
-                               "No explanations, just the topics."
+                    "content": "You are a helpful assistant that summarizes voice recordings. "
+                               "Return a JSON object with two fields: \"summary\", a concise "
+                               "2-3 sentence summary of the key points, and \"topics\", a list "
+                               "of 3-5 single-word or short-phrase topics."
                 },
                 {
                     "role": "user",
-                    "content": f"Extract topics from this transcript:\n\n{text[:4000]}"
+                    "content": f"Summarize this transcript and extract its topics:\n\n{truncate_tokens(text, SUMMARY_MAX_TOKENS)[0]}"
                 }
             ],
-            max_tokens=50,
+            response_format={"type": "json_object"},
+            max_tokens=250,
             temperature=0.3
         )
-        topics_str = response.choices[0].message.content.strip()
-        topics = [t.strip().lower() for t in topics_str.split(',')]
-        logger.info(f"Extracted topics: {topics}")
-        return topics
+        result = orjson.loads(response.choices[0].message.content)
+
+        summary = (result.get('summary') or '').strip() or None
+        topics = result.get('topics') or []
+        if isinstance(topics, str):
+            topics = topics.split(',')
+        topics = [t.strip().lower() for t in topics if str(t).strip()] or None
+
+        if summary:
+            logger.info("Generated summary: %s...", summary[:100])
+        logger.info("Extracted topics: %s", topics)
+        return summary, topics
     except Exception as e:
-        logger.error(f"Failed to extract topics: {e}")
-        return None
+        logger.error("Failed to generate summary and topics: %s", e)
+        return None, None
 
 
-def perform_speaker_diarization(audio_path: str) -> Optional[List[Dict[str, Any]]]:
-    """Perform speaker diarization on audio file."""
+def perform_speaker_diarization(
+    audio: Union[str, BinaryIO, Dict[str, Any]]
+) -> Optional[List[Dict[str, Any]]]:
+    """Perform speaker diarization on an audio file, buffer or in-memory waveform."""
     if not diarization_pipeline:
         logger.warning("Speaker diarization pipeline not available, skipping")
         return None
 
     try:
-        logger.info(f"Performing speaker diarization on {audio_path}")
+        logger.info("Performing speaker diarization")
 
-        # Run diarization
-        diarization = diarization_pipeline(audio_path)
+        # Run diarization, in float16 on tensor cores when on the GPU
+        import torch
+        with torch.autocast('cuda', dtype=torch.float16, enabled=DIARIZATION_FP16):
+            diarization = diarization_pipeline(audio)
 
         # Convert to list of speaker segments
         speaker_segments = []
@@ -273,11 +630,11 @@ def perform_speaker_diarization(audio_path: str) -> Optional[List[Dict[str, Any]
 
         # Count unique speakers
         unique_speakers = set(seg['speaker'] for seg in speaker_segments)
-        logger.info(f"Detected {len(unique_speakers)} speakers in {len(speaker_segments)} segments")
+        logger.info("Detected %s speakers in %s segments", len(unique_speakers), len(speaker_segments))
 
         return speaker_segments
     except Exception as e:
-        logger.error(f"Failed to perform speaker diarization: {e}")
+        logger.error("Failed to perform speaker diarization: %s", e)
         return None
 
 
@@ -286,74 +643,141 @@ def assign_speakers_to_transcript(
     speaker_segments: Optional[List[Dict[str, Any]]]
 ) -> List[Dict[str, Any]]:
     """Assign speaker labels to transcript segments."""
-    if not speaker_segments:
+    if not speaker_segments or not transcript_segments:
         return transcript_segments
 
-    # For each transcript segment, find the overlapping speaker
-    for segment in transcript_segments:
-        segment_start = segment['start']
-        segment_end = segment['end']
-        segment_mid = (segment_start + segment_end) / 2
-
-        # Find speaker at the midpoint of the segment
-        speaker = None
-        for spk_seg in speaker_segments:
-            if spk_seg['start'] <= segment_mid <= spk_seg['end']:
-                speaker = spk_seg['speaker']
-                break
-
-        # If no exact match, find the closest speaker segment
-        if not speaker:
-            min_distance = float('inf')
-            for spk_seg in speaker_segments:
-                # Calculate overlap or distance
-                overlap_start = max(segment_start, spk_seg['start'])
-                overlap_end = min(segment_end, spk_seg['end'])
-
-                if overlap_start < overlap_end:
-                    # There's overlap
-                    speaker = spk_seg['speaker']
-                    break
-                else:
-                    # Calculate distance
-                    distance = min(
-                        abs(segment_start - spk_seg['end']),
-                        abs(segment_end - spk_seg['start'])
-                    )
-                    if distance < min_distance:
-                        min_distance = distance
-                        speaker = spk_seg['speaker']
+    # Speaker turns as arrays ordered by start (pyannote already yields them
+    # in this order, the stable sort keeps ties as given)
+    order = np.argsort([spk_seg['start'] for spk_seg in speaker_segments], kind='stable')
+    spk_starts = np.array([speaker_segments[i]['start'] for i in order], dtype=np.float64)
+    spk_ends = np.array([speaker_segments[i]['end'] for i in order], dtype=np.float64)
+    spk_labels = [speaker_segments[i]['speaker'] for i in order]
+
+    seg_starts = np.array([segment['start'] for segment in transcript_segments], dtype=np.float64)
+    seg_ends = np.array([segment['end'] for segment in transcript_segments], dtype=np.float64)
+    seg_mids = (seg_starts + seg_ends) / 2
+
+    # Find the first speaker turn containing the midpoint of each segment:
+    # turns starting at or before the midpoint form a prefix, and the first
+    # turn ending at or after it is where the running max of ends reaches it
+    started = np.searchsorted(spk_starts, seg_mids, side='right')
+    first_reaching = np.searchsorted(np.maximum.accumulate(spk_ends), seg_mids, side='left')
+    matched = first_reaching < started
+    chosen = np.where(matched, first_reaching, 0)
+
+    # If no exact match, take the first overlapping turn, else the closest one
+    misses = np.flatnonzero(~matched)
+    if misses.size:
+        miss_starts = seg_starts[misses, None]
+        miss_ends = seg_ends[misses, None]
+        overlap = np.minimum(miss_ends, spk_ends) - np.maximum(miss_starts, spk_starts)
+        distance = np.minimum(
+            np.abs(miss_starts - spk_ends),
+            np.abs(miss_ends - spk_starts)
+        )
+        has_overlap = (overlap > 0).any(axis=1)
+        chosen[misses] = np.where(
+            has_overlap,
+            np.argmax(overlap > 0, axis=1),
+            np.argmin(distance, axis=1)
+        )
 
+    for segment, index in zip(transcript_segments, chosen.tolist()):
+        speaker = spk_labels[index]
         segment['speaker'] = speaker if speaker else 'SPEAKER_00'
 
     return transcript_segments
 
 
-def upload_transcript_to_s3(transcript_data: Dict[str, Any], s3_key: str) -> bool:
-    """Upload transcript JSON to S3."""
+def encode_transcript(transcript_data: Dict[str, Any]) -> bytes:
+    """Serialize transcript data as compact, gzip-compressed JSON."""
+    # Per-segment embeddings make the indented form MBs; orjson emits compact
+    # UTF-8 bytes directly and serializes any numpy values natively
+    return gzip.compress(
+        orjson.dumps(transcript_data, option=orjson.OPT_SERIALIZE_NUMPY),
+        compresslevel=6
+    )
+
+
+def result_cache_key(user_id: str, audio: io.BytesIO) -> str:
+    """S3 key of the cached result for this user's audio content."""
+    return f"{RESULT_CACHE_PREFIX}{user_id}/{hashlib.sha256(audio.getbuffer()).hexdigest()}.json"
+
+
+def load_cached_result(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Load a previously finished transcript for the same audio, if any."""
     try:
-        logger.info(f"Uploading transcript to s3://{TRANSCRIPTS_BUCKET}/{s3_key}")
+        response = s3_client.get_object(Bucket=TRANSCRIPTS_BUCKET, Key=cache_key)
+        return orjson.loads(gzip.decompress(response['Body'].read()))
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            logger.warning("Failed to read result cache %s: %s", cache_key, e)
+        return None
+
 
+def save_cached_result(cache_key: str, transcript_data: Dict[str, Any]) -> None:
+    """Cache a finished transcript; failures only cost a recomputation on retry."""
+    try:
         s3_client.put_object(
             Bucket=TRANSCRIPTS_BUCKET,
-            Key=s3_key,
-            Body=json.dumps(transcript_data, indent=2),
-            ContentType='application/json'
+            Key=cache_key,
+            Body=encode_transcript(transcript_data),
+            ContentType='application/json',
+            ContentEncoding='gzip'
         )
+    except ClientError as e:
+        logger.warning("Failed to write result cache %s: %s", cache_key, e)
+
+
+def store_with_result_cache(cache_key: str, transcript_data: Dict[str, Any], cached: bool = False) -> bool:
+    """Store a transcript, cache it if storing fails, and drop the cache entry once stored."""
+    if not store_transcript(transcript_data):
+        if not cached:
+            save_cached_result(cache_key, transcript_data)
+        return False
+    if cached:
+        try:
+            s3_client.delete_object(Bucket=TRANSCRIPTS_BUCKET, Key=cache_key)
+        except ClientError as e:
+            logger.warning("Failed to delete result cache %s: %s", cache_key, e)
+    return True
 
-        # Also upload plain text version
+
+def upload_transcript_to_s3(transcript_data: Dict[str, Any], s3_key: str) -> bool:
+    """Upload transcript JSON (gzip-compressed) and its plain text version to S3."""
+    try:
+        logger.info("Uploading transcript to s3://%s/%s", TRANSCRIPTS_BUCKET, s3_key)
+
+        json_body = encode_transcript(transcript_data)
         txt_key = s3_key.replace('.json', '.txt')
-        s3_client.put_object(
-            Bucket=TRANSCRIPTS_BUCKET,
-            Key=txt_key,
-            Body=transcript_data['fullText'],
-            ContentType='text/plain'
-        )
+
+        # The two objects are independent, so upload them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            uploads = [
+                executor.submit(
+                    s3_client.put_object,
+                    Bucket=TRANSCRIPTS_BUCKET,
+                    Key=s3_key,
+                    Body=json_body,
+                    ContentType='application/json',
+                    ContentEncoding='gzip'
+                ),
+                # Also upload plain text version
+                executor.submit(
+                    s3_client.put_object,
+                    Bucket=TRANSCRIPTS_BUCKET,
+                    Key=txt_key,
+                    Body=transcript_data['fullText'],
+                    ContentType='text/plain'
+                )
+            ]
+            for upload in uploads:
+                upload.result()
 
         logger.info("Transcript uploaded successfully")
         return True
     except ClientError as e:
-        logger.error(f"Failed to upload transcript: {e}")
+        logger.error("Failed to upload transcript: %s", e)
         return False
 
 
@@ -362,39 +786,35 @@ def auto_index_transcript(transcript_data: Dict[str, Any]) -> bool:
     Automatically index a new transcript in the local RAG system.
     This runs asynchronously and won't block the main worker.
     """
+    global rag_indexer
+    if rag_indexer is False:
+        return False
+
     try:
-        # Only index if RAG system is available
-        from indexer import TranscriptIndexer
-        from rag_config import RAG_CONFIG
-        import tempfile
+        if rag_indexer is None:
+            # Only index if RAG system is available; the indexer (and its
+            # embedding model) is loaded once and reused for every message
+            from indexer import TranscriptIndexer
+            rag_indexer = TranscriptIndexer()
 
         logger.info("Auto-indexing transcript for RAG system...")
 
-        # Save transcript to temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(transcript_data, f, indent=2)
-            temp_path = Path(f.name)
+        # Index straight from memory rather than via a temporary JSON file
+        chunks_added, chunks_skipped = rag_indexer.index_transcript(transcript_data)
 
-        try:
-            # Initialize indexer and index the transcript
-            indexer = TranscriptIndexer()
-            chunks_added, chunks_skipped = indexer.index_transcript(temp_path)
-
-            if chunks_added > 0:
-                logger.info(f"✅ Auto-indexed transcript: {chunks_added} chunk(s) added to RAG system")
-                return True
-            else:
-                logger.debug(f"Transcript already indexed or no chunks created")
-                return False
-        finally:
-            # Clean up temp file
-            temp_path.unlink(missing_ok=True)
+        if chunks_added > 0:
+            logger.info("✅ Auto-indexed transcript: %s chunk(s) added to RAG system", chunks_added)
+            return True
+        else:
+            logger.debug("Transcript already indexed or no chunks created")
+            return False
 
     except ImportError:
         logger.debug("RAG system not available (indexer not installed)")
+        rag_indexer = False
         return False
     except Exception as e:
-        logger.warning(f"Failed to auto-index transcript: {e}")
+        logger.warning("Failed to auto-index transcript: %s", e)
         # Don't fail the main transcription job if indexing fails
         return False
 
@@ -408,12 +828,11 @@ def update_dynamodb_record(
     embedding: Optional[List[float]] = None,
     summary: Optional[str] = None,
     topics: Optional[List[str]] = None,
-    status: str = 'TRANSCRIBED'
+    status: str = 'TRANSCRIBED',
+    updated_at: Optional[str] = None
 ) -> bool:
     """Update DynamoDB record with transcription results."""
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
-
         # Build update expression dynamically
         update_parts = [
             '#status = :status',
@@ -433,14 +852,15 @@ def update_dynamodb_record(
             ':key': transcript_s3_key,
             ':lang': language,
             ':dur': Decimal(str(duration_seconds)),
-            ':now': datetime.utcnow().isoformat() + 'Z'
+            ':now': updated_at or datetime.utcnow().isoformat() + 'Z'
         }
 
         # Add optional fields
         if embedding:
             update_parts.append('embedding = :embedding')
-            # Convert floats to Decimal for DynamoDB compatibility
-            attr_values[':embedding'] = [Decimal(str(f)) for f in embedding]
+            # Raw float16 bytes as a Binary attribute (~3 KB instead of a
+            # ~1536-element list of Decimals)
+            attr_values[':embedding'] = Binary(np.asarray(embedding, dtype='<f2').tobytes())
 
         if summary:
             update_parts.append('summary = :summary')
@@ -452,7 +872,7 @@ def update_dynamodb_record(
 
         update_expression = 'SET ' + ', '.join(update_parts)
 
-        table.update_item(
+        dynamo_table.update_item(
             Key={
                 'PK': user_id,
                 'SK': recording_id
@@ -462,170 +882,344 @@ def update_dynamodb_record(
             ExpressionAttributeValues=attr_values
         )
 
-        logger.info(f"DynamoDB record updated: {recording_id}")
+        logger.info("DynamoDB record updated: %s", recording_id)
         return True
     except ClientError as e:
-        logger.error(f"Failed to update DynamoDB: {e}")
+        logger.error("Failed to update DynamoDB: %s", e)
         return False
 
 
-def process_message(message: Dict[str, Any]) -> bool:
-    """Process a single SQS message."""
+def fetch_message_audio(message: Dict[str, Any]) -> Optional[io.BytesIO]:
+    """Download the audio referenced by an SQS message into memory."""
+    body = orjson.loads(message['Body'])
+    return download_audio_from_s3(body['bucket'], body['key'])
+
+
+def process_message(message: Dict[str, Any], prefetched: Optional[Future] = None) -> Optional[Future]:
+    """Process a single SQS message.
+
+    Runs the GPU stages (transcription, diarization, speaker identification)
+    here, then hands the IO-bound remainder to the finishing pool so the GPU
+    can start on the next message straight away.
+
+    ``prefetched`` is a future from ``fetch_message_audio`` started while the
+    previous message was processing; without it the audio is downloaded here.
+
+    Returns:
+        Future resolving to True once the recording is stored (the caller then
+        deletes the message), or None if the message failed before that point
+    """
     try:
+        audio = prefetched.result() if prefetched is not None else fetch_message_audio(message)
+        if audio is None:
+            return None
+
         # Debug: Log the raw message body
         raw_body = message['Body']
-        logger.debug(f"Raw message body: {raw_body}")
+        logger.debug("Raw message body: %s", raw_body)
 
-        body = json.loads(raw_body)
-        receipt_handle = message['ReceiptHandle']
+        body = orjson.loads(raw_body)
         
         recording_id = body['recordingId']
-        bucket = body['bucket']
-        key = body['key']
         user_id = body['userId']
         device_id = body['deviceId']
         started_at = body['startedAt']
         ended_at = body['endedAt']
         
-        logger.info(f"Processing recording: {recording_id}")
-        logger.info(f"Device: {device_id}, Time: {started_at}")
+        logger.info("Processing recording: %s", recording_id)
+        logger.info("Device: %s, Time: %s", device_id, started_at)
+
+        # A redelivered message whose audio was already processed only needs storing
+        cache_key = result_cache_key(user_id, audio)
+        cached = load_cached_result(cache_key)
+        if cached is not None:
+            logger.info("Reusing cached result for recording: %s", recording_id)
+            cached.update(
+                recordingId=recording_id,
+                userId=user_id,
+                deviceId=device_id,
+                transcribedAt=datetime.utcnow().isoformat() + 'Z'
+            )
+            return finish_executor.submit(store_with_result_cache, cache_key, cached, cached=True)
+
+        # Decode once; Whisper, diarization and speaker embeddings reuse the
+        # samples instead of each decoding the file again on the CPU
+        samples = decode_recording(audio)
+
+        # Start speaker diarization alongside transcription
+        logger.info("Performing speaker diarization...")
+        speaker_audio = as_pyannote_audio(samples) if diarization_pipeline else None
+        diarization_future = diarization_executor.submit(perform_speaker_diarization, speaker_audio)
+
+        # Transcribe
+        transcript_result = transcribe_audio(samples)
+        if not transcript_result:
+            diarization_future.cancel()
+            return None
+
+        full_text = transcript_result['full_text']
+
+        # Start AI enhancements (embeddings, summary and topics) in the background;
+        # they only need the text, so they overlap with the remaining GPU work.
+        # The full text and every segment are embedded in one batched request;
+        # short segments are passed as empty text, which generate_embeddings
+        # skips while keeping results aligned with the segments.
+        logger.info("Generating AI enhancements...")
+        summary_future = enhancement_executor.submit(generate_summary_and_topics, full_text)
+        embeddings_future = enhancement_executor.submit(
+            generate_embeddings,
+            [full_text] + [
+                segment['text'] if len(segment['text'].split()) >= SEGMENT_EMBEDDING_MIN_WORDS else ''
+                for segment in transcript_result['segments']
+            ]
+        )
 
-        # Determine file extension from S3 key
-        file_ext = '.mp3' if key.endswith('.mp3') else '.wav'
+        # Join speaker diarization
+        speaker_segments = diarization_future.result()
 
-        # Create temporary file for audio
-        with tempfile.NamedTemporaryFile(suffix=file_ext, delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-        
-        try:
-            # Download audio
-            if not download_audio_from_s3(bucket, key, tmp_path):
-                return False
-            
-            # Transcribe
-            transcript_result = transcribe_audio(tmp_path)
-            if not transcript_result:
-                return False
+        # Assign speakers to transcript segments
+        segments_with_speakers = assign_speakers_to_transcript(
+            transcript_result['segments'],
+            speaker_segments
+        )
 
-            full_text = transcript_result['full_text']
+        # Identify speakers against known profiles and update profiles
+        speaker_mapping = {}
+        if speaker_segments:
+            logger.info("Identifying speakers against known profiles...")
+            try:
+                segments_with_speakers, speaker_mapping = identify_speakers_in_recording(
+                    speaker_audio,
+                    user_id,
+                    speaker_segments,
+                    segments_with_speakers
+                )
+                logger.info("Speaker mapping: %s", speaker_mapping)
+            except Exception as e:
+                logger.warning("Speaker identification failed: %s", e)
+
+        return finish_executor.submit(
+            finish_recording,
+            body,
+            transcript_result,
+            segments_with_speakers,
+            bool(speaker_segments),
+            summary_future,
+            embeddings_future,
+            cache_key
+        )
 
-            # Perform speaker diarization
-            logger.info("Performing speaker diarization...")
-            speaker_segments = perform_speaker_diarization(tmp_path)
+    except Exception as e:
+        logger.error("Error processing message: %s", e, exc_info=True)
+        return None
 
-            # Assign speakers to transcript segments
-            segments_with_speakers = assign_speakers_to_transcript(
-                transcript_result['segments'],
-                speaker_segments
-            )
 
-            # Identify speakers against known profiles and update profiles
-            speaker_mapping = {}
-            if speaker_segments:
-                logger.info("Identifying speakers against known profiles...")
-                try:
-                    segments_with_speakers, speaker_mapping = identify_speakers_in_recording(
-                        tmp_path,
-                        user_id,
-                        speaker_segments,
-                        segments_with_speakers
-                    )
-                    logger.info(f"Speaker mapping: {speaker_mapping}")
-                except Exception as e:
-                    logger.warning(f"Speaker identification failed: {e}")
-
-            # Generate AI enhancements (embeddings, summary, topics)
-            logger.info("Generating AI enhancements...")
-            embedding = generate_embedding(full_text)
-            summary = generate_summary(full_text)
-            topics = extract_topics(full_text)
-
-            # Generate embeddings for each segment
-            segments_with_embeddings = []
-            for segment in segments_with_speakers:
-                segment_embedding = generate_embedding(segment['text'])
-                segment_with_embedding = segment.copy()
-                if segment_embedding:
-                    segment_with_embedding['embedding'] = segment_embedding
-                segments_with_embeddings.append(segment_with_embedding)
-
-            # Prepare transcript data
-            transcript_data = {
-                'recordingId': recording_id,
-                'userId': user_id,
-                'deviceId': device_id,
-                'language': transcript_result['language'],
-                'segments': segments_with_embeddings,
-                'fullText': full_text,
-                'durationSeconds': transcript_result['duration_seconds'],
-                'transcribedAt': datetime.utcnow().isoformat() + 'Z',
-                'whisperModel': transcript_result['whisper_model']
-            }
+def finish_recording(
+    body: Dict[str, Any],
+    transcript_result: Dict[str, Any],
+    segments_with_speakers: List[Dict[str, Any]],
+    has_speakers: bool,
+    summary_future: Future,
+    embeddings_future: Future,
+    cache_key: str
+) -> bool:
+    """Assemble a transcribed recording, cache it, then store it via ``store_transcript``."""
+    try:
+        recording_id = body['recordingId']
+        user_id = body['userId']
+        device_id = body['deviceId']
+        full_text = transcript_result['full_text']
+
+        # Join AI enhancements; segment order is unchanged by speaker assignment
+        summary, topics = summary_future.result()
+        all_embeddings = embeddings_future.result()
+        embedding = all_embeddings[0]
+
+        segments_with_embeddings = []
+        for segment, segment_embedding in zip(segments_with_speakers, all_embeddings[1:]):
+            segment_with_embedding = segment.copy()
+            if segment_embedding:
+                segment_with_embedding['embedding'] = pack_embedding(segment_embedding)
+            segments_with_embeddings.append(segment_with_embedding)
+
+        # Prepare transcript data
+        now_iso = datetime.utcnow().isoformat() + 'Z'
+        transcript_data = {
+            'recordingId': recording_id,
+            'userId': user_id,
+            'deviceId': device_id,
+            'language': transcript_result['language'],
+            'segments': segments_with_embeddings,
+            'fullText': full_text,
+            'durationSeconds': transcript_result['duration_seconds'],
+            'transcribedAt': now_iso,
+            'whisperModel': transcript_result['whisper_model']
+        }
+
+        # Add AI enhancements to transcript data
+        if embedding:
+            transcript_data['embedding'] = pack_embedding(embedding)
+        if summary:
+            transcript_data['summary'] = summary
+        if topics:
+            transcript_data['topics'] = topics
+        if has_speakers:
+            # Get unique speakers with their names
+            unique_speakers = {}
+            for seg in segments_with_embeddings:
+                if 'speakerId' in seg:
+                    unique_speakers[seg['speakerId']] = seg.get('speakerName', seg['speakerId'])
+            transcript_data['speakers'] = list(unique_speakers.keys())
+            transcript_data['speakerNames'] = unique_speakers
+            transcript_data['speakerCount'] = len(unique_speakers)
+
+        return store_with_result_cache(cache_key, transcript_data)
 
-            # Add AI enhancements to transcript data
-            if embedding:
-                transcript_data['embedding'] = embedding
-            if summary:
-                transcript_data['summary'] = summary
-            if topics:
-                transcript_data['topics'] = topics
-            if speaker_segments:
-                # Get unique speakers with their names
-                unique_speakers = {}
-                for seg in segments_with_embeddings:
-                    if 'speakerId' in seg:
-                        unique_speakers[seg['speakerId']] = seg.get('speakerName', seg['speakerId'])
-                transcript_data['speakers'] = list(unique_speakers.keys())
-                transcript_data['speakerNames'] = unique_speakers
-                transcript_data['speakerCount'] = len(unique_speakers)
-
-            # Generate S3 key for transcript
-            transcript_s3_key = f"transcripts/{user_id}/{device_id}/{recording_id}.json"
-
-            # Upload transcript
-            if not upload_transcript_to_s3(transcript_data, transcript_s3_key):
-                return False
-
-            # Auto-index transcript for RAG system (non-blocking)
+    except Exception as e:
+        logger.error("Error finishing recording: %s", e, exc_info=True)
+        return False
+
+
+def store_transcript(transcript_data: Dict[str, Any]) -> bool:
+    """Store a transcript (S3, RAG index, DynamoDB)."""
+    try:
+        recording_id = transcript_data['recordingId']
+        user_id = transcript_data['userId']
+        device_id = transcript_data['deviceId']
+        embedding = transcript_data.get('embedding')
+
+        # Generate S3 key for transcript
+        transcript_s3_key = f"transcripts/{user_id}/{device_id}/{recording_id}.json"
+
+        # Upload transcript
+        if not upload_transcript_to_s3(transcript_data, transcript_s3_key):
+            return False
+
+        # Auto-index transcript for RAG system (non-blocking)
+        with index_lock:
             auto_index_transcript(transcript_data)
 
-            # Update DynamoDB
-            if not update_dynamodb_record(
-                user_id,
-                recording_id,
-                transcript_s3_key,
-                transcript_result['language'],
-                transcript_result['duration_seconds'],
-                embedding,
-                summary,
-                topics
-            ):
-                return False
-            
-            # Delete message from queue
-            sqs_client.delete_message(
-                QueueUrl=SQS_QUEUE_URL,
-                ReceiptHandle=receipt_handle
-            )
-            
-            logger.info(f"Successfully processed recording: {recording_id}")
-            return True
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-    
+        # Update DynamoDB
+        if not update_dynamodb_record(
+            user_id,
+            recording_id,
+            transcript_s3_key,
+            transcript_data['language'],
+            transcript_data['durationSeconds'],
+            unpack_embedding(embedding) if embedding else None,
+            transcript_data.get('summary'),
+            transcript_data.get('topics'),
+            updated_at=transcript_data['transcribedAt']
+        ):
+            return False
+        
+        logger.info("Successfully processed recording: %s", recording_id)
+        return True
+
     except Exception as e:
-        logger.error(f"Error processing message: {e}", exc_info=True)
+        logger.error("Error storing transcript: %s", e, exc_info=True)
         return False
 
 
+def delete_messages(receipt_handles: List[str]) -> None:
+    """Delete processed messages from the queue, up to 10 per batch request."""
+    for start in range(0, len(receipt_handles), 10):
+        entries = [
+            {'Id': str(i), 'ReceiptHandle': receipt_handle}
+            for i, receipt_handle in enumerate(receipt_handles[start:start + 10])
+        ]
+        try:
+            response = sqs_client.delete_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=entries)
+            failed = [entries[int(entry['Id'])] for entry in response.get('Failed', [])]
+        except ClientError as e:
+            logger.error("Failed to delete message batch: %s", e)
+            failed = entries
+
+        # Retry failed entries one at a time
+        for entry in failed:
+            try:
+                sqs_client.delete_message(
+                    QueueUrl=SQS_QUEUE_URL,
+                    ReceiptHandle=entry['ReceiptHandle']
+                )
+            except ClientError as e:
+                logger.error("Failed to delete message: %s", e)
+
+
+def delete_stored_messages(pending: List[Tuple[str, Future]]) -> List[Tuple[str, Future]]:
+    """Delete the messages whose recordings are stored.
+
+    ``pending`` pairs receipt handles with ``process_message`` futures; those
+    not done yet are returned.
+    """
+    stored, still_pending = [], []
+    for receipt_handle, finished in pending:
+        if finished.done():
+            if finished.result():
+                stored.append(receipt_handle)
+        else:
+            still_pending.append((receipt_handle, finished))
+    delete_messages(stored)
+    return still_pending
+
+
+def extend_visibility(receipt_handles: List[str]) -> None:
+    """Keep a batch's messages that aren't stored yet hidden from other consumers."""
+    for start in range(0, len(receipt_handles), 10):
+        entries = [
+            {'Id': str(i), 'ReceiptHandle': receipt_handle, 'VisibilityTimeout': VISIBILITY_TIMEOUT}
+            for i, receipt_handle in enumerate(receipt_handles[start:start + 10])
+        ]
+        try:
+            response = sqs_client.change_message_visibility_batch(QueueUrl=SQS_QUEUE_URL, Entries=entries)
+            for failed in response.get('Failed', []):
+                logger.error("Failed to extend message visibility: %s", failed.get('Message'))
+        except ClientError as e:
+            logger.error("Failed to extend visibility of message batch: %s", e)
+
+
+class VisibilityHeartbeat:
+    """Keep a batch's unfinished messages hidden from other consumers.
+
+    A background thread extends the visibility of the tracked receipt handles
+    every third of VISIBILITY_TIMEOUT, however long a single recording or the
+    wait for the batch's uploads takes.
+    """
+
+    def __init__(self, receipt_handles: List[str]):
+        self._receipt_handles = list(receipt_handles)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rem-visibility', daemon=True)
+        self._thread.start()
+
+    def track(self, receipt_handles: List[str]) -> None:
+        """Replace the handles still being worked on (finished ones may reappear)."""
+        with self._lock:
+            self._receipt_handles = list(receipt_handles)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(VISIBILITY_TIMEOUT / 3):
+            with self._lock:
+                receipt_handles = list(self._receipt_handles)
+            if receipt_handles:
+                extend_visibility(receipt_handles)
+
+
 def poll_and_process():
     """Main worker loop - poll SQS and process messages."""
     logger.info("Starting REM GPU Worker")
-    logger.info(f"Queue: {SQS_QUEUE_URL}")
-    logger.info(f"Model: {WHISPER_MODEL} on {WHISPER_DEVICE}")
+    logger.info("Queue: %s", SQS_QUEUE_URL)
+    logger.info("Model: %s on %s", WHISPER_MODEL, WHISPER_DEVICE)
+
+    # Models and clients live for the whole process: move them out of the
+    # collector's generations so later collections don't keep rescanning them
+    gc.collect()
+    gc.freeze()
     
     while True:
         try:
@@ -639,21 +1233,47 @@ def poll_and_process():
             
             messages = response.get('Messages', [])
             
+            # Long polling already waited up to 20 s; poll again straight away
             if not messages:
                 logger.debug("No messages in queue")
-                time.sleep(POLL_INTERVAL)
                 continue
             
-            logger.info(f"Received {len(messages)} message(s)")
+            logger.info("Received %s message(s)", len(messages))
             
-            for message in messages:
-                process_message(message)
+            # Messages go through the GPU one at a time; the next message's
+            # audio downloads and finished ones upload in the background.
+            # Each message is deleted as soon as its recording is stored, and
+            # the heartbeat keeps every message not finished yet hidden.
+            pending = []
+            heartbeat = VisibilityHeartbeat([message['ReceiptHandle'] for message in messages])
+            try:
+                prefetched = prefetch_executor.submit(fetch_message_audio, messages[0])
+                for i, message in enumerate(messages):
+                    current = prefetched
+                    if i + 1 < len(messages):
+                        prefetched = prefetch_executor.submit(fetch_message_audio, messages[i + 1])
+                    finished = process_message(message, current)
+                    if finished is not None:
+                        pending.append((message['ReceiptHandle'], finished))
+                    pending = delete_stored_messages(pending)
+                    heartbeat.track(
+                        [receipt_handle for receipt_handle, _ in pending] +
+                        [waiting['ReceiptHandle'] for waiting in messages[i + 1:]]
+                    )
+
+                # Let the batch finish before receiving more, bounding work in flight
+                while pending:
+                    wait([finished for _, finished in pending], return_when=FIRST_COMPLETED)
+                    pending = delete_stored_messages(pending)
+                    heartbeat.track([receipt_handle for receipt_handle, _ in pending])
+            finally:
+                heartbeat.stop()
         
         except KeyboardInterrupt:
             logger.info("Shutting down worker...")
             break
         except Exception as e:
-            logger.error(f"Error in main loop: {e}", exc_info=True)
+            logger.error("Error in main loop: %s", e, exc_info=True)
             time.sleep(POLL_INTERVAL)
 
 
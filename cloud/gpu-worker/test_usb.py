@@ -3,11 +3,37 @@
 Test script to check what's on your USB drive
 """
 
+import os
+import json
 import sys
 from pathlib import Path
 
 USB_MOUNT_BASE = '/Volumes'
 AUDIO_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.flac'}
+MARKER_SUFFIX = '.rem_processed'
+PROCESSED_INDEX = '.rem_processed.json'
+
+def iter_files(root):
+    """Yield a DirEntry for every file under root, in a single scandir walk."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+        except OSError:
+            continue
+
+def load_processed_index(volume):
+    """Return the processed index of a volume as a set of absolute paths."""
+    try:
+        with open(volume / PROCESSED_INDEX) as f:
+            return {str(volume / rel) for rel in json.load(f)}
+    except (OSError, ValueError):
+        return set()
 
 def scan_usb():
     """Scan all USB volumes and show what files are found."""
@@ -39,17 +65,20 @@ def scan_usb():
         print(f"📁 {volume.name} ({volume})")
         print("=" * 60)
         
-        # Count all files
-        all_files = list(volume.rglob('*'))
-        total_files = sum(1 for f in all_files if f.is_file())
-        
-        # Find audio files
+        # Count all files, find audio files and processed markers in one pass
+        total_files = 0
         audio_files = []
-        for file_path in volume.rglob('*'):
-            if file_path.is_file():
-                ext = file_path.suffix.lower()
-                if ext in AUDIO_EXTENSIONS:
-                    audio_files.append(file_path)
+        markers = load_processed_index(volume)
+        sample_files = []  # First 20 files, shown when there's no audio
+        for entry in iter_files(volume):
+            total_files += 1
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext in AUDIO_EXTENSIONS:
+                audio_files.append((Path(entry.path), entry.stat().st_size))
+            elif ext == MARKER_SUFFIX:
+                markers.add(entry.path)
+            if len(sample_files) < 20:
+                sample_files.append((entry.name, ext))
         
         print(f"  Total files: {total_files}")
         print(f"  Audio files: {len(audio_files)}")
@@ -57,21 +86,20 @@ def scan_usb():
         
         if audio_files:
             print("  🎵 Audio files found:")
-            for audio in audio_files:
-                size_mb = audio.stat().st_size / (1024 * 1024)
-                marker = audio.parent / f"{audio.name}.rem_processed"
-                processed = "✅ PROCESSED" if marker.exists() else "🆕 NEW"
+            for audio, size in audio_files:
+                size_mb = size / (1024 * 1024)
+                done = str(audio) in markers or f"{audio}{MARKER_SUFFIX}" in markers
+                processed = "✅ PROCESSED" if done else "🆕 NEW"
                 print(f"    {processed} - {audio.name} ({size_mb:.2f} MB)")
                 print(f"      Path: {audio}")
         else:
             print("  ⚠️  No audio files found (.wav, .mp3, .m4a, .flac)")
             print()
             print("  📄 All files on USB:")
-            file_list = [f for f in all_files if f.is_file()][:20]  # Show first 20
-            for f in file_list:
-                print(f"    - {f.name} ({f.suffix})")
-            if len(file_list) < total_files:
-                print(f"    ... and {total_files - len(file_list)} more files")
+            for name, ext in sample_files:
+                print(f"    - {name} ({ext})")
+            if len(sample_files) < total_files:
+                print(f"    ... and {total_files - len(sample_files)} more files")
         
         print()
 
@@ -11,12 +11,17 @@ import time
 import json
 import subprocess
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Set, Tuple
 import shutil
 
 import boto3
-from botocore.exceptions import ClientError
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -37,13 +42,51 @@ SQS_QUEUE_URL = os.getenv('SQS_QUEUE_URL')
 # USB Configuration
 USB_MOUNT_BASE = '/Volumes'  # macOS mount point
 AUDIO_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.flac'}
-PROCESSED_MARKER = '.rem_processed'
+PROCESSED_MARKER = '.rem_processed'  # Legacy per-file marker, still honoured
+# Processed files are recorded in one index at the volume root, as paths
+# relative to the volume
+PROCESSED_INDEX = '.rem_processed.json'
+# Files uploaded at once; more mostly contends for the USB drive's read bandwidth
+FILE_WORKERS = 4
+SQS_BATCH_SIZE = 10  # SendMessageBatch maximum
+# With FSEvents, mounts are seen as they happen; /Volumes is still rescanned
+# this often in case an event is missed
+FALLBACK_POLL_INTERVAL = 60
+MOUNT_SETTLE_SECONDS = 2
+
+# Recordings above the threshold upload as parallel multipart chunks; the
+# client's connection pool has to cover every transfer thread
+S3_UPLOAD_CONCURRENCY = 10
+s3_transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=S3_UPLOAD_CONCURRENCY,
+    use_threads=True
+)
 
 # AWS clients
-s3_client = boto3.client('s3', region_name=AWS_REGION)
+s3_client = boto3.client(
+    's3',
+    region_name=AWS_REGION,
+    config=Config(max_pool_connections=S3_UPLOAD_CONCURRENCY * FILE_WORKERS)
+)
 sqs_client = boto3.client('sqs', region_name=AWS_REGION)
 
 
+# S3 keys and recording IDs are millisecond timestamps; concurrent uploads
+# take strictly increasing values so they never collide
+_timestamp_lock = threading.Lock()
+_last_timestamp = 0
+
+
+def unique_timestamp_ms() -> int:
+    """Current time in milliseconds, unique across threads."""
+    global _last_timestamp
+    with _timestamp_lock:
+        _last_timestamp = max(int(time.time() * 1000), _last_timestamp + 1)
+        return _last_timestamp
+
+
 def get_mounted_volumes() -> List[str]:
     """Get list of currently mounted volumes (excluding system volumes)."""
     volumes = []
@@ -62,16 +105,47 @@ def get_mounted_volumes() -> List[str]:
     return volumes
 
 
-def find_audio_files(volume_path: str) -> List[Path]:
-    """Find all audio files in the volume."""
+def load_processed_index(volume_path: str) -> Set[str]:
+    """Load the relative paths of files already processed on a volume."""
+    try:
+        with open(os.path.join(volume_path, PROCESSED_INDEX)) as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to read processed index on {volume_path}: {e}")
+        return set()
+
+
+def save_processed_index(volume_path: str, processed: Set[str]):
+    """Write the processed index, replacing the old one atomically."""
+    index_path = os.path.join(volume_path, PROCESSED_INDEX)
+    tmp_path = f"{index_path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(processed), f)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.error(f"Failed to write processed index on {volume_path}: {e}")
+
+
+def find_audio_files(volume_path: str, processed: Optional[Set[str]] = None) -> List[Path]:
+    """Find all audio files in the volume that haven't been processed."""
+    if processed is None:
+        processed = load_processed_index(volume_path)
     audio_files = []
-    volume = Path(volume_path)
 
-    for file_path in volume.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in AUDIO_EXTENSIONS:
+    # One directory walk; legacy markers are matched by name against the
+    # same listing instead of a stat per audio file
+    for root, _, files in os.walk(volume_path):
+        markers = {name for name in files if name.endswith(PROCESSED_MARKER)}
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in AUDIO_EXTENSIONS:
+                continue
             # Skip if already processed
-            marker = file_path.parent / f"{file_path.name}{PROCESSED_MARKER}"
-            if not marker.exists():
+            file_path = Path(root, name)
+            if (f"{name}{PROCESSED_MARKER}" not in markers and
+                    os.path.relpath(file_path, volume_path) not in processed):
                 audio_files.append(file_path)
 
     return audio_files
@@ -81,7 +155,7 @@ def upload_to_s3(file_path: Path, user_id: str, device_id: str) -> Optional[str]
     """Upload audio file to S3 and return S3 key."""
     try:
         # Generate S3 key
-        timestamp = int(time.time() * 1000)
+        timestamp = unique_timestamp_ms()
         s3_key = f"raw/{user_id}/{device_id}/{timestamp}{file_path.suffix}"
 
         logger.info(f"Uploading {file_path.name} to s3://{RAW_AUDIO_BUCKET}/{s3_key}")
@@ -90,57 +164,68 @@ def upload_to_s3(file_path: Path, user_id: str, device_id: str) -> Optional[str]
             str(file_path),
             RAW_AUDIO_BUCKET,
             s3_key,
-            ExtraArgs={'ContentType': f'audio/{file_path.suffix[1:]}'}
+            ExtraArgs={'ContentType': f'audio/{file_path.suffix[1:]}'},
+            Config=s3_transfer_config
         )
 
         logger.info(f"Upload complete: {s3_key}")
         return s3_key
 
-    except ClientError as e:
+    except (ClientError, BotoCoreError, S3UploadFailedError, OSError) as e:
+        # upload_file wraps S3 errors in S3UploadFailedError; OSError covers
+        # a drive pulled mid-read
         logger.error(f"Failed to upload to S3: {e}")
         return None
 
 
-def send_transcription_job(s3_key: str, user_id: str, device_id: str) -> bool:
-    """Send transcription job to SQS."""
+def build_transcription_job(s3_key: str, user_id: str, device_id: str) -> dict:
+    """Build the SQS message body for a transcription job."""
+    return {
+        'recordingId': f"{device_id}_{unique_timestamp_ms()}",
+        'bucket': RAW_AUDIO_BUCKET,
+        'key': s3_key,
+        'userId': user_id,
+        'deviceId': device_id,
+        'startedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'endedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+
+
+def send_transcription_jobs(jobs: List[Tuple[Path, dict]]) -> List[Path]:
+    """Send up to 10 transcription jobs to SQS in one request.
+
+    Returns the files whose jobs were queued.
+    """
     try:
-        message = {
-            'recordingId': f"{device_id}_{int(time.time() * 1000)}",
-            'bucket': RAW_AUDIO_BUCKET,
-            'key': s3_key,
-            'userId': user_id,
-            'deviceId': device_id,
-            'startedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
-            'endedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
-        }
-
-        logger.info(f"Sending transcription job to SQS")
-
-        sqs_client.send_message(
+        logger.info(f"Sending {len(jobs)} transcription job(s) to SQS")
+
+        response = sqs_client.send_message_batch(
             QueueUrl=SQS_QUEUE_URL,
-            MessageBody=json.dumps(message)
+            Entries=[
+                {'Id': str(i), 'MessageBody': json.dumps(message)}
+                for i, (_, message) in enumerate(jobs)
+            ]
         )
 
-        logger.info("Transcription job queued")
-        return True
-
-    except ClientError as e:
-        logger.error(f"Failed to send SQS message: {e}")
-        return False
+        for failed in response.get('Failed', []):
+            file_path = jobs[int(failed['Id'])][0]
+            logger.error(f"Failed to queue transcription for {file_path.name}: {failed.get('Message')}")
 
+        queued = [jobs[int(entry['Id'])][0] for entry in response.get('Successful', [])]
+        logger.info(f"{len(queued)} transcription job(s) queued")
+        return queued
 
-def mark_as_processed(file_path: Path):
-    """Mark file as processed to avoid re-uploading."""
-    marker = file_path.parent / f"{file_path.name}{PROCESSED_MARKER}"
-    marker.touch()
-    logger.info(f"Marked as processed: {file_path.name}")
+    except ClientError as e:
+        logger.error(f"Failed to send SQS messages: {e}")
+        return []
 
 
 def process_volume(volume_path: str, user_id: str, device_id: str):
     """Process all audio files in a volume."""
     logger.info(f"Processing volume: {volume_path}")
 
-    audio_files = find_audio_files(volume_path)
+    processed_index = load_processed_index(volume_path)
+    audio_files = find_audio_files(volume_path, processed_index)
 
     if not audio_files:
         logger.info("No new audio files found")
@@ -148,21 +233,76 @@ def process_volume(volume_path: str, user_id: str, device_id: str):
 
     logger.info(f"Found {len(audio_files)} audio file(s)")
 
-    for file_path in audio_files:
-        logger.info(f"Processing: {file_path.name}")
+    # Uploads are network bound, so several run at once; finished uploads are
+    # queued for transcription 10 jobs per SQS request, and the processed
+    # index is written once per batch to avoid re-uploading them
+    processed = 0
+    pending: List[Tuple[Path, dict]] = []
+
+    def queue_pending():
+        nonlocal processed
+        queued = send_transcription_jobs(pending)
+        pending.clear()
+        if not queued:
+            return
+        for file_path in queued:
+            processed_index.add(os.path.relpath(file_path, volume_path))
+            logger.info(f"Marked as processed: {file_path.name}")
+        save_processed_index(volume_path, processed_index)
+        processed += len(queued)
 
-        # Upload to S3
-        s3_key = upload_to_s3(file_path, user_id, device_id)
+    try:
+        with ThreadPoolExecutor(max_workers=FILE_WORKERS, thread_name_prefix='usb-upload') as executor:
+            futures = {
+                executor.submit(upload_to_s3, file_path, user_id, device_id): file_path
+                for file_path in audio_files
+            }
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    s3_key = future.result()
+                except Exception as e:
+                    # Keep collecting the other uploads rather than dropping them
+                    logger.error(f"Unexpected error uploading {file_path.name}: {e}")
+                    s3_key = None
+
+                if not s3_key:
+                    logger.error(f"Failed to upload {file_path.name}, skipping")
+                    continue
+
+                pending.append((file_path, build_transcription_job(s3_key, user_id, device_id)))
+                if len(pending) == SQS_BATCH_SIZE:
+                    queue_pending()
+    finally:
+        # Uploaded files are queued and recorded even if the loop is cut
+        # short, so they aren't left orphaned in S3 and uploaded again
+        if pending:
+            queue_pending()
+
+    logger.info(f"Processed {processed}/{len(audio_files)} audio file(s)")
+
+
+def start_volume_observer(changed: threading.Event):
+    """Watch USB_MOUNT_BASE with FSEvents, setting `changed` on any event.
+
+    Returns the running observer, or None when watchdog isn't installed.
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        logger.info("watchdog not installed, polling for new volumes")
+        return None
 
-        if not s3_key:
-            logger.error(f"Failed to upload {file_path.name}, skipping")
-            continue
+    class VolumeEventHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            changed.set()
 
-        # Send transcription job
-        if send_transcription_job(s3_key, user_id, device_id):
-            mark_as_processed(file_path)
-        else:
-            logger.error(f"Failed to queue transcription for {file_path.name}")
+    observer = Observer()
+    observer.schedule(VolumeEventHandler(), USB_MOUNT_BASE, recursive=False)
+    observer.start()
+    logger.info(f"Watching {USB_MOUNT_BASE} for mount events")
+    return observer
 
 
 def watch_for_usb(user_id: str, device_id: str, poll_interval: int = 5, process_existing: bool = True):
@@ -181,21 +321,30 @@ def watch_for_usb(user_id: str, device_id: str, poll_interval: int = 5, process_
             logger.info(f"Checking existing volume: {volume}")
             process_volume(volume, user_id, device_id)
 
+    # Mount events wake the loop straight away; with FSEvents the timeout is
+    # only a safety net for missed events, otherwise it's the poll interval
+    changed = threading.Event()
+    observer = start_volume_observer(changed)
+    wait_interval = poll_interval if observer is None else max(poll_interval, FALLBACK_POLL_INTERVAL)
+
     while True:
         try:
+            if changed.wait(wait_interval):
+                # Give the new volume a moment to finish mounting
+                time.sleep(MOUNT_SETTLE_SECONDS)
+                changed.clear()
+
             current_volumes = set(get_mounted_volumes())
 
             # Check for new volumes
             new_volumes = current_volumes - known_volumes
 
-            if new_volumes:
-                for volume in new_volumes:
-                    logger.info(f"New USB drive detected: {volume}")
-                    process_volume(volume, user_id, device_id)
+            for volume in new_volumes:
+                logger.info(f"New USB drive detected: {volume}")
+                process_volume(volume, user_id, device_id)
 
-                known_volumes = current_volumes
-
-            time.sleep(poll_interval)
+            # Track removals too, so re-inserting a drive is detected
+            known_volumes = current_volumes
 
         except KeyboardInterrupt:
             logger.info("Shutting down USB watcher...")
@@ -204,6 +353,10 @@ def watch_for_usb(user_id: str, device_id: str, poll_interval: int = 5, process_
             logger.error(f"Error in watch loop: {e}", exc_info=True)
             time.sleep(poll_interval)
 
+    if observer is not None:
+        observer.stop()
+        observer.join()
+
 
 if __name__ == '__main__':
     # Get user ID and device ID from environment or command line
@@ -449,6 +449,7 @@ resource "aws_iam_role_policy" "ecs_task" {
         Action = [
           "sqs:ReceiveMessage",
           "sqs:DeleteMessage",
+          "sqs:ChangeMessageVisibility",
           "sqs:GetQueueAttributes"
         ]
         Resource = aws_sqs_queue.transcription_jobs.arn
@@ -467,6 +468,14 @@ resource "aws_iam_role_policy" "ecs_task" {
         ]
         Resource = "${aws_s3_bucket.transcripts.arn}/*"
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:DeleteObject"
+        ]
+        Resource = "${aws_s3_bucket.transcripts.arn}/_cache/*"
+      },
       {
         Effect = "Allow"
         Action = [
@@ -90,6 +90,19 @@ resource "aws_s3_bucket_lifecycle_configuration" "transcripts" {
       storage_class = "GLACIER_IR"
     }
   }
+
+  rule {
+    id     = "expire-result-cache"
+    status = "Enabled"
+
+    filter {
+      prefix = "_cache/"  # Worker results kept for redelivered messages
+    }
+
+    expiration {
+      days = 7
+    }
+  }
 }
 
 # Block public access for both buckets
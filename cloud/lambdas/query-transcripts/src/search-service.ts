@@ -21,6 +21,36 @@ export function cosineSimilarity(a: number[], b: number[]): number {
   return dotProduct / (magnitudeA * magnitudeB);
 }
 
+/**
+ * Convert an IEEE 754 half-precision value to a number
+ */
+function halfToFloat(half: number): number {
+  const sign = half & 0x8000 ? -1 : 1;
+  const exponent = (half >> 10) & 0x1f;
+  const fraction = half & 0x3ff;
+
+  if (exponent === 0) return sign * Math.pow(2, -14) * (fraction / 1024);
+  if (exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+
+  return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+}
+
+/**
+ * Unpack a stored embedding. The GPU worker packs embeddings as base64
+ * little-endian float16; older transcripts store plain number arrays.
+ */
+export function unpackEmbedding(value: number[] | string): number[] {
+  if (typeof value !== 'string') return value;
+
+  const bytes = Buffer.from(value, 'base64');
+  const embedding = new Array<number>(bytes.length / 2);
+  for (let i = 0; i < embedding.length; i++) {
+    embedding[i] = halfToFloat(bytes.readUInt16LE(i * 2));
+  }
+
+  return embedding;
+}
+
 /**
  * Generate embedding for a query using OpenAI
  */
@@ -126,7 +156,7 @@ export function semanticSearchInTranscript(
 
     if (!segment.embedding) continue;
 
-    const similarity = cosineSimilarity(queryEmbedding, segment.embedding);
+    const similarity = cosineSimilarity(queryEmbedding, unpackEmbedding(segment.embedding));
 
     if (similarity > 0.7) {
       const contextSegments = [];
@@ -3,6 +3,7 @@
  * Handles fetching transcripts from S3 and formatting results
  */
 
+import { gunzipSync } from 'zlib';
 import { S3Client, GetObjectCommand } from '@aws-sdk/client-s3';
 import { TranscriptData, QueryResultSegment, ChatGPTMemory } from './types';
 
@@ -22,8 +23,13 @@ export async function getTranscriptFromS3(
       })
     );
 
-    const bodyString = await response.Body?.transformToString();
-    if (!bodyString) return null;
+    const bodyBytes = await response.Body?.transformToByteArray();
+    if (!bodyBytes || bodyBytes.length === 0) return null;
+
+    // The GPU worker stores transcript JSON gzip-compressed
+    const bodyString = response.ContentEncoding === 'gzip'
+      ? gunzipSync(bodyBytes).toString('utf-8')
+      : Buffer.from(bodyBytes).toString('utf-8');
 
     return JSON.parse(bodyString) as TranscriptData;
   } catch (error) {
@@ -50,7 +50,7 @@ export interface TranscriptSegment {
   start: number;
   end: number;
   text: string;
-  embedding?: number[];
+  embedding?: number[] | string;  // base64 float16 from the GPU worker
   speaker?: string;
 }
 
@@ -64,7 +64,7 @@ export interface TranscriptData {
   durationSeconds: number;
   transcribedAt: string;
   whisperModel: string;
-  embedding?: number[];
+  embedding?: number[] | string;  // base64 float16 from the GPU worker
   summary?: string;
   topics?: string[];
   speakers?: string[];
@@ -4,25 +4,48 @@ REM Transcription Worker Lambda
 Processes SQS messages, transcribes audio with Whisper, and stores results.
 """
 
+import base64
+import gzip
+import io
 import os
 import json
-import tempfile
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 import boto3
+import numpy as np
+import orjson
 import torch
+from boto3.dynamodb.types import Binary
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients (initialized once, reused across invocations)
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+# AWS clients (initialized once, reused across invocations). Adaptive retries
+# back off client-side when SQS bursts throttle S3 or DynamoDB, and the pool
+# covers the parallel ranged GETs below.
+aws_config = Config(
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    max_pool_connections=32
+)
+s3_client = boto3.client('s3', config=aws_config)
+dynamodb = boto3.resource('dynamodb', config=aws_config)
+dynamodb_table = None
+
+# Large recordings download as parallel ranged GETs
+s3_transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10
+)
 
 # Configuration from environment
 RAW_AUDIO_BUCKET = os.getenv('RAW_AUDIO_BUCKET')
@@ -32,24 +55,76 @@ WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_TOKEN')
 
+# Whisper's input rate; audio is decoded once at this rate for Whisper and
+# pyannote alike
+SAMPLE_RATE = 16000
+
+# Texts per embeddings request. Only the full text gets near the per-input
+# limit; the rest are short segments, so a batch stays well under the API's
+# per-request token cap.
+EMBEDDING_BATCH_SIZE = 96
+
+# Inputs are cut to these token counts (text-embedding-3-small accepts 8191
+# tokens per input; the summary prompt is capped to bound cost)
+EMBEDDING_MAX_TOKENS = 8000
+SUMMARY_MAX_TOKENS = 5000
+
 # Determine device (CUDA for NVIDIA, MPS for Mac, CPU otherwise)
 DEVICE = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
 logger.info(f"Using device: {DEVICE}")
 
+# Whisper runs on CTranslate2, which has no Metal backend: int8 weights with
+# fp16 activations on CUDA, plain int8 on the CPU
+WHISPER_DEVICE = 'cuda' if DEVICE == 'cuda' else 'cpu'
+WHISPER_COMPUTE_TYPE = os.getenv(
+    'WHISPER_COMPUTE_TYPE',
+    'int8_float16' if WHISPER_DEVICE == 'cuda' else 'int8'
+)
+
+if DEVICE == 'cuda':
+    # Let cuDNN autotune pyannote's conv kernels and use TF32 tensor cores
+    torch.backends.cudnn.benchmark = True
+    torch.set_float32_matmul_precision('high')
+
+# OpenAI enhancement requests are independent network calls; they run
+# concurrently with each other and with diarization
+enhancement_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='rem-openai')
+# Diarization only needs the audio, so it runs alongside Whisper
+diarization_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rem-diarize')
+
 # Lazy-loaded heavy dependencies (loaded once per container lifecycle)
 whisper_model = None
 openai_client = None
 diarization_pipeline = None
+tokenizer = None
 
 
 def get_whisper_model():
     """Lazy-load Whisper model (expensive operation)."""
     global whisper_model
     if whisper_model is None:
-        logger.info(f"Loading Whisper model: {WHISPER_MODEL} on {DEVICE}")
-        import whisper
-        whisper_model = whisper.load_model(WHISPER_MODEL, device=DEVICE, download_root='/tmp/whisper-models')
+        logger.info(f"Loading Whisper model: {WHISPER_MODEL} on {WHISPER_DEVICE} ({WHISPER_COMPUTE_TYPE})")
+        from faster_whisper import WhisperModel
+        whisper_model = WhisperModel(
+            WHISPER_MODEL,
+            device=WHISPER_DEVICE,
+            compute_type=WHISPER_COMPUTE_TYPE,
+            download_root='/tmp/whisper-models'
+        )
         logger.info("Whisper model loaded")
+
+        # Warm up with a second of silence so kernel selection and allocator
+        # setup happen once per container, not on the first job
+        try:
+            warmup_segments, _ = whisper_model.transcribe(
+                np.zeros(16000, dtype=np.float32),
+                beam_size=5,
+                vad_filter=False
+            )
+            list(warmup_segments)
+            logger.info("Whisper model warmed up")
+        except Exception as e:
+            logger.warning(f"Whisper warm-up failed: {e}")
     return whisper_model
 
 
@@ -63,6 +138,41 @@ def get_openai_client():
     return openai_client
 
 
+def get_tokenizer():
+    """Lazy-load the tiktoken encoding used to truncate OpenAI inputs."""
+    global tokenizer
+    if tokenizer is None:
+        try:
+            import tiktoken
+            # cl100k_base is text-embedding-3's encoding; it never counts
+            # fewer tokens than gpt-4o-mini's o200k_base for the same text
+            tokenizer = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer, truncating by characters: {e}")
+            tokenizer = False  # Mark as attempted
+    return tokenizer if tokenizer is not False else None
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens.
+
+    Falls back to max_tokens characters when the tokenizer is unavailable.
+    """
+    # Every token covers at least one UTF-8 byte, so short texts can't be
+    # over the limit and skip encoding
+    if len(text) * 4 <= max_tokens:
+        return text
+
+    encoding = get_tokenizer()
+    if encoding is None:
+        return text[:max_tokens]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
 def get_diarization_pipeline():
     """Lazy-load speaker diarization pipeline."""
     global diarization_pipeline
@@ -82,26 +192,38 @@ def get_diarization_pipeline():
     return diarization_pipeline if diarization_pipeline is not False else None
 
 
-def download_audio_from_s3(bucket: str, key: str, local_path: str) -> bool:
-    """Download audio file from S3 to local path."""
+def download_audio_from_s3(bucket: str, key: str) -> Optional[bytes]:
+    """Download an audio file from S3 into memory."""
     try:
-        logger.info(f"Downloading s3://{bucket}/{key} to {local_path}")
-        s3_client.download_file(bucket, key, local_path)
-        logger.info(f"Download successful")
-        return True
+        logger.info(f"Downloading s3://{bucket}/{key}")
+        buffer = io.BytesIO()
+        s3_client.download_fileobj(bucket, key, buffer, Config=s3_transfer_config)
+        logger.info(f"Download successful ({buffer.tell()} bytes)")
+        return buffer.getvalue()
     except ClientError as e:
         logger.error(f"Failed to download from S3: {e}")
-        return False
+        return None
+
+
+def download_job_audio(message_body: Dict[str, Any]) -> Optional[bytes]:
+    """Download a job's audio and return its bytes."""
+    return download_audio_from_s3(message_body['bucket'], message_body['key'])
+
+
+def decode_recording(audio: bytes) -> np.ndarray:
+    """Decode audio bytes to 16 kHz mono float32 samples."""
+    from faster_whisper import decode_audio
+    return decode_audio(io.BytesIO(audio), sampling_rate=SAMPLE_RATE)
 
 
-def transcribe_audio(audio_path: str) -> Optional[Dict[str, Any]]:
-    """Transcribe audio file using Whisper."""
+def transcribe_audio(samples: np.ndarray) -> Optional[Dict[str, Any]]:
+    """Transcribe decoded audio using Whisper."""
     try:
         model = get_whisper_model()
-        logger.info(f"Starting transcription of {audio_path}")
+        logger.info(f"Starting transcription of {len(samples) / SAMPLE_RATE:.2f}s of audio")
         
         segments, info = model.transcribe(
-            audio_path,
+            samples,
             beam_size=5,
             vad_filter=True,
             vad_parameters=dict(min_silence_duration_ms=500)
@@ -134,57 +256,38 @@ def transcribe_audio(audio_path: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def generate_embedding(text: str) -> Optional[List[float]]:
-    """Generate embedding for text using OpenAI."""
-    client = get_openai_client()
-    if not client:
-        return None
-
-    try:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text[:8000]
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        logger.error(f"Failed to generate embedding: {e}")
-        return None
-
+def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """Generate embeddings for many texts, EMBEDDING_BATCH_SIZE per OpenAI request.
 
-def generate_summary(text: str) -> Optional[str]:
-    """Generate AI summary using OpenAI."""
+    Returns one entry per input text, in order; None for empty texts and
+    for texts whose request failed.
+    """
+    embeddings: List[Optional[List[float]]] = [None] * len(texts)
     client = get_openai_client()
     if not client:
-        return None
+        return embeddings
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that summarizes voice recordings. "
-                               "Create a concise 2-3 sentence summary of the key points."
-                },
-                {
-                    "role": "user",
-                    "content": f"Summarize this transcript:\n\n{text[:4000]}"
-                }
-            ],
-            max_tokens=150,
-            temperature=0.3
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logger.error(f"Failed to generate summary: {e}")
-        return None
+    indexed = [(i, truncate_tokens(text, EMBEDDING_MAX_TOKENS)) for i, text in enumerate(texts) if text and text.strip()]
+    for start in range(0, len(indexed), EMBEDDING_BATCH_SIZE):
+        batch = indexed[start:start + EMBEDDING_BATCH_SIZE]
+        try:
+            response = client.embeddings.create(
+                model="text-embedding-3-small",
+                input=[text for _, text in batch]
+            )
+            for item in response.data:
+                embeddings[batch[item.index][0]] = item.embedding
+        except Exception as e:
+            logger.error(f"Failed to generate embeddings: {e}")
+
+    return embeddings
 
 
-def extract_topics(text: str) -> Optional[List[str]]:
-    """Extract topics using OpenAI."""
+def generate_summary_and_topics(text: str) -> Tuple[Optional[str], Optional[List[str]]]:
+    """Generate an AI summary and key topics in one OpenAI call."""
     client = get_openai_client()
     if not client:
-        return None
+        return None, None
 
     try:
         response = client.chat.completions.create(
@@ -192,35 +295,43 @@ def extract_topics(text: str) -> Optional[List[str]]:
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a helpful assistant that extracts key topics from voice recordings. "
-                               "Return ONLY a comma-separated list of 3-5 single-word or short-phrase topics. "
-                               "No explanations, just the topics."
+                    "content": "You are a helpful assistant that summarizes voice recordings. "
+                               "Return a JSON object with two fields: \"summary\", a concise "
+                               "2-3 sentence summary of the key points, and \"topics\", a list "
+                               "of 3-5 single-word or short-phrase topics."
                 },
                 {
                     "role": "user",
-                    "content": f"Extract topics from this transcript:\n\n{text[:4000]}"
+                    "content": f"Summarize this transcript and extract its topics:\n\n{truncate_tokens(text, SUMMARY_MAX_TOKENS)}"
                 }
             ],
-            max_tokens=50,
+            response_format={"type": "json_object"},
+            max_tokens=250,
             temperature=0.3
         )
-        topics_str = response.choices[0].message.content.strip()
-        topics = [t.strip().lower() for t in topics_str.split(',')]
-        return topics
+        result = json.loads(response.choices[0].message.content)
+
+        summary = (result.get('summary') or '').strip() or None
+        topics = result.get('topics') or []
+        if isinstance(topics, str):
+            topics = topics.split(',')
+        topics = [t.strip().lower() for t in topics if str(t).strip()] or None
+        return summary, topics
     except Exception as e:
-        logger.error(f"Failed to extract topics: {e}")
-        return None
+        logger.error(f"Failed to generate summary and topics: {e}")
+        return None, None
 
 
-def perform_speaker_diarization(audio_path: str) -> Optional[List[Dict[str, Any]]]:
-    """Perform speaker diarization."""
+def perform_speaker_diarization(samples: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+    """Perform speaker diarization on decoded audio."""
     pipeline = get_diarization_pipeline()
     if not pipeline:
         return None
 
     try:
-        logger.info(f"Performing speaker diarization on {audio_path}")
-        diarization = pipeline(audio_path)
+        logger.info(f"Performing speaker diarization on {len(samples) / SAMPLE_RATE:.2f}s of audio")
+        waveform = torch.from_numpy(samples).unsqueeze(0)
+        diarization = pipeline({'waveform': waveform, 'sample_rate': SAMPLE_RATE})
 
         speaker_segments = []
         for turn, _, speaker in diarization.itertracks(yield_label=True):
@@ -243,52 +354,81 @@ def assign_speakers_to_transcript(
     speaker_segments: Optional[List[Dict[str, Any]]]
 ) -> List[Dict[str, Any]]:
     """Assign speaker labels to transcript segments."""
-    if not speaker_segments:
+    if not speaker_segments or not transcript_segments:
         return transcript_segments
 
-    for segment in transcript_segments:
-        segment_mid = (segment['start'] + segment['end']) / 2
-
-        # Find speaker at midpoint
-        speaker = None
-        for spk_seg in speaker_segments:
-            if spk_seg['start'] <= segment_mid <= spk_seg['end']:
-                speaker = spk_seg['speaker']
-                break
-
-        # If no exact match, find closest
-        if not speaker:
-            min_distance = float('inf')
-            for spk_seg in speaker_segments:
-                overlap_start = max(segment['start'], spk_seg['start'])
-                overlap_end = min(segment['end'], spk_seg['end'])
-
-                if overlap_start < overlap_end:
-                    speaker = spk_seg['speaker']
-                    break
-                else:
-                    distance = min(
-                        abs(segment['start'] - spk_seg['end']),
-                        abs(segment['end'] - spk_seg['start'])
-                    )
-                    if distance < min_distance:
-                        min_distance = distance
-                        speaker = spk_seg['speaker']
+    # Speaker turns as arrays ordered by start (pyannote already yields them
+    # in this order, the stable sort keeps ties as given)
+    order = np.argsort([spk_seg['start'] for spk_seg in speaker_segments], kind='stable')
+    spk_starts = np.array([speaker_segments[i]['start'] for i in order], dtype=np.float64)
+    spk_ends = np.array([speaker_segments[i]['end'] for i in order], dtype=np.float64)
+    spk_labels = [speaker_segments[i]['speaker'] for i in order]
+
+    seg_starts = np.array([segment['start'] for segment in transcript_segments], dtype=np.float64)
+    seg_ends = np.array([segment['end'] for segment in transcript_segments], dtype=np.float64)
+    seg_mids = (seg_starts + seg_ends) / 2
+
+    # Find the first speaker turn containing the midpoint of each segment:
+    # turns starting at or before the midpoint form a prefix, and the first
+    # turn ending at or after it is where the running max of ends reaches it
+    started = np.searchsorted(spk_starts, seg_mids, side='right')
+    first_reaching = np.searchsorted(np.maximum.accumulate(spk_ends), seg_mids, side='left')
+    matched = first_reaching < started
+    chosen = np.where(matched, first_reaching, 0)
+
+    # If no exact match, take the first overlapping turn, else the closest one
+    misses = np.flatnonzero(~matched)
+    if misses.size:
+        miss_starts = seg_starts[misses, None]
+        miss_ends = seg_ends[misses, None]
+        overlap = np.minimum(miss_ends, spk_ends) - np.maximum(miss_starts, spk_starts)
+        distance = np.minimum(
+            np.abs(miss_starts - spk_ends),
+            np.abs(miss_ends - spk_starts)
+        )
+        has_overlap = (overlap > 0).any(axis=1)
+        chosen[misses] = np.where(
+            has_overlap,
+            np.argmax(overlap > 0, axis=1),
+            np.argmin(distance, axis=1)
+        )
 
+    for segment, index in zip(transcript_segments, chosen.tolist()):
+        speaker = spk_labels[index]
         segment['speaker'] = speaker if speaker else 'SPEAKER_00'
 
     return transcript_segments
 
 
+def pack_embedding(embedding: List[float]) -> str:
+    """
+    Pack an embedding as base64 little-endian float16 for transcript JSON.
+
+    Same format as the GPU worker; the query lambda reads both this and
+    plain lists.
+    """
+    return base64.b64encode(np.asarray(embedding, dtype='<f2').tobytes()).decode('ascii')
+
+
+def encode_transcript(transcript_data: Dict[str, Any]) -> bytes:
+    """Serialize transcript data as compact, gzip-compressed JSON."""
+    # orjson emits UTF-8 bytes directly, without an intermediate str
+    return gzip.compress(
+        orjson.dumps(transcript_data, option=orjson.OPT_SERIALIZE_NUMPY),
+        compresslevel=6
+    )
+
+
 def upload_transcript_to_s3(transcript_data: Dict[str, Any], s3_key: str) -> bool:
-    """Upload transcript JSON to S3."""
+    """Upload transcript JSON (gzip-compressed) to S3."""
     try:
         logger.info(f"Uploading transcript to s3://{TRANSCRIPTS_BUCKET}/{s3_key}")
         s3_client.put_object(
             Bucket=TRANSCRIPTS_BUCKET,
             Key=s3_key,
-            Body=json.dumps(transcript_data, indent=2),
-            ContentType='application/json'
+            Body=encode_transcript(transcript_data),
+            ContentType='application/json',
+            ContentEncoding='gzip'
         )
         logger.info("Transcript uploaded successfully")
         return True
@@ -297,6 +437,14 @@ def upload_transcript_to_s3(transcript_data: Dict[str, Any], s3_key: str) -> boo
         return False
 
 
+def get_dynamodb_table():
+    """Lazy-load the recordings DynamoDB table."""
+    global dynamodb_table
+    if dynamodb_table is None:
+        dynamodb_table = dynamodb.Table(DYNAMODB_TABLE)
+    return dynamodb_table
+
+
 def update_dynamodb_record(
     user_id: str,
     recording_id: str,
@@ -310,7 +458,7 @@ def update_dynamodb_record(
 ) -> bool:
     """Update DynamoDB record with transcription results."""
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
+        table = get_dynamodb_table()
 
         update_expr = 'SET #status = :status, transcriptS3Key = :s3key, #lang = :lang, durationSeconds = :dur, updatedAt = :updated'
         expr_attr_names = {'#status': 'status', '#lang': 'language'}
@@ -325,7 +473,9 @@ def update_dynamodb_record(
         # Add optional fields
         if embedding:
             update_expr += ', embedding = :embedding'
-            expr_attr_values[':embedding'] = embedding
+            # Raw float16 bytes as a Binary attribute, as the GPU worker
+            # stores it; the serializer rejects plain floats
+            expr_attr_values[':embedding'] = Binary(np.asarray(embedding, dtype='<f2').tobytes())
 
         if summary:
             update_expr += ', summary = :summary'
@@ -344,110 +494,118 @@ def update_dynamodb_record(
 
         logger.info("DynamoDB record updated successfully")
         return True
-    except ClientError as e:
+    except (ClientError, TypeError) as e:
+        # TypeError is boto3's serializer rejecting an attribute value
         logger.error(f"Failed to update DynamoDB: {e}")
         return False
 
 
-def process_transcription_job(message_body: Dict[str, Any]) -> bool:
-    """Process a single transcription job."""
+def process_transcription_job(message_body: Dict[str, Any], audio: Optional[bytes] = None) -> bool:
+    """Process a single transcription job.
+
+    audio is the job's audio if it was already downloaded (see
+    download_job_audio); otherwise it is downloaded here. Audio is kept in
+    memory, so nothing is left in /tmp between jobs.
+    """
     try:
-        bucket = message_body['bucket']
-        key = message_body['key']
         user_id = message_body['userId']
         recording_id = message_body['recordingId']
         device_id = message_body['deviceId']
 
         logger.info(f"Processing recording: {recording_id}")
 
-        # Download audio to /tmp
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False, dir='/tmp') as tmp_file:
-            tmp_path = tmp_file.name
+        # Download audio into memory
+        audio = audio or download_job_audio(message_body)
+        if not audio:
+            return False
+
+        # Decode once; Whisper and pyannote share the samples
+        samples = decode_recording(audio)
+        del audio
+
+        # Start speaker diarization alongside transcription
+        logger.info("Performing speaker diarization...")
+        diarization_future = diarization_executor.submit(perform_speaker_diarization, samples)
+
+        # Transcribe
+        transcript_result = transcribe_audio(samples)
+        if not transcript_result:
+            # Don't leave diarization running into the next job
+            diarization_future.result()
+            return False
+
+        full_text = transcript_result['full_text']
+
+        # AI enhancements only need the text, so start them before joining
+        # diarization; the full text and every segment are embedded in batched requests
+        logger.info("Generating AI enhancements...")
+        summary_future = enhancement_executor.submit(generate_summary_and_topics, full_text)
+        embeddings_future = enhancement_executor.submit(
+            generate_embeddings_batch,
+            [full_text] + [segment['text'] for segment in transcript_result['segments']]
+        )
 
-        try:
-            if not download_audio_from_s3(bucket, key, tmp_path):
-                return False
-
-            # Transcribe
-            transcript_result = transcribe_audio(tmp_path)
-            if not transcript_result:
-                return False
-
-            full_text = transcript_result['full_text']
-
-            # Speaker diarization
-            logger.info("Performing speaker diarization...")
-            speaker_segments = perform_speaker_diarization(tmp_path)
-            segments_with_speakers = assign_speakers_to_transcript(
-                transcript_result['segments'],
-                speaker_segments
-            )
+        # Join speaker diarization
+        speaker_segments = diarization_future.result()
+        segments_with_speakers = assign_speakers_to_transcript(
+            transcript_result['segments'],
+            speaker_segments
+        )
+
+        summary, topics = summary_future.result()
+        embedding, *segment_embeddings = embeddings_future.result()
+
+        # The segments are this job's own dicts, so embeddings go in place
+        segments_with_embeddings = segments_with_speakers
+        for segment, segment_embedding in zip(segments_with_embeddings, segment_embeddings):
+            if segment_embedding:
+                segment['embedding'] = pack_embedding(segment_embedding)
+
+        # Prepare transcript data
+        transcript_data = {
+            'recordingId': recording_id,
+            'userId': user_id,
+            'deviceId': device_id,
+            'language': transcript_result['language'],
+            'segments': segments_with_embeddings,
+            'fullText': full_text,
+            'durationSeconds': transcript_result['duration_seconds'],
+            'transcribedAt': datetime.utcnow().isoformat() + 'Z',
+            'whisperModel': transcript_result['whisper_model']
+        }
 
-            # AI enhancements
-            logger.info("Generating AI enhancements...")
-            embedding = generate_embedding(full_text)
-            summary = generate_summary(full_text)
-            topics = extract_topics(full_text)
-
-            # Generate embeddings for segments
-            segments_with_embeddings = []
-            for segment in segments_with_speakers:
-                segment_embedding = generate_embedding(segment['text'])
-                segment_with_embedding = segment.copy()
-                if segment_embedding:
-                    segment_with_embedding['embedding'] = segment_embedding
-                segments_with_embeddings.append(segment_with_embedding)
-
-            # Prepare transcript data
-            transcript_data = {
-                'recordingId': recording_id,
-                'userId': user_id,
-                'deviceId': device_id,
-                'language': transcript_result['language'],
-                'segments': segments_with_embeddings,
-                'fullText': full_text,
-                'durationSeconds': transcript_result['duration_seconds'],
-                'transcribedAt': datetime.utcnow().isoformat() + 'Z',
-                'whisperModel': transcript_result['whisper_model']
-            }
-
-            # Add AI enhancements
-            if embedding:
-                transcript_data['embedding'] = embedding
-            if summary:
-                transcript_data['summary'] = summary
-            if topics:
-                transcript_data['topics'] = topics
-            if speaker_segments:
-                unique_speakers = list(set(seg['speaker'] for seg in segments_with_embeddings if 'speaker' in seg))
-                transcript_data['speakers'] = unique_speakers
-                transcript_data['speakerCount'] = len(unique_speakers)
-
-            # Upload transcript
-            transcript_s3_key = f"transcripts/{user_id}/{device_id}/{recording_id}.json"
-            if not upload_transcript_to_s3(transcript_data, transcript_s3_key):
-                return False
-
-            # Update DynamoDB
-            if not update_dynamodb_record(
-                user_id,
-                recording_id,
-                transcript_s3_key,
-                transcript_result['language'],
-                transcript_result['duration_seconds'],
-                embedding,
-                summary,
-                topics
-            ):
-                return False
-
-            logger.info(f"Successfully processed recording: {recording_id}")
-            return True
-
-        finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        # Add AI enhancements
+        if embedding:
+            transcript_data['embedding'] = pack_embedding(embedding)
+        if summary:
+            transcript_data['summary'] = summary
+        if topics:
+            transcript_data['topics'] = topics
+        if speaker_segments:
+            unique_speakers = list(set(seg['speaker'] for seg in segments_with_embeddings if 'speaker' in seg))
+            transcript_data['speakers'] = unique_speakers
+            transcript_data['speakerCount'] = len(unique_speakers)
+
+        # Upload transcript
+        transcript_s3_key = f"transcripts/{user_id}/{device_id}/{recording_id}.json"
+        if not upload_transcript_to_s3(transcript_data, transcript_s3_key):
+            return False
+
+        # Update DynamoDB
+        if not update_dynamodb_record(
+            user_id,
+            recording_id,
+            transcript_s3_key,
+            transcript_result['language'],
+            transcript_result['duration_seconds'],
+            embedding,
+            summary,
+            topics
+        ):
+            return False
+
+        logger.info(f"Successfully processed recording: {recording_id}")
+        return True
 
     except Exception as e:
         logger.error(f"Error processing job: {e}", exc_info=True)
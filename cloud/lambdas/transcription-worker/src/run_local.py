@@ -10,6 +10,8 @@ import json
 import logging
 import sys
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -19,7 +21,8 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import boto3
-from handler import process_transcription_job, DEVICE
+from botocore.exceptions import ClientError
+from handler import process_transcription_job, download_job_audio, DEVICE
 
 # Configure logging
 logging.basicConfig(
@@ -89,6 +92,92 @@ if AWS_REGION: os.environ['AWS_REGION'] = AWS_REGION
 # Also set AWS_DEFAULT_REGION for boto3
 os.environ['AWS_DEFAULT_REGION'] = AWS_REGION
 
+VISIBILITY_TIMEOUT = 300  # 5 minutes visibility timeout
+MAX_MESSAGES = 10  # SQS maximum per receive
+
+# Downloads the next job's audio while the current one is on the GPU
+download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rem-prefetch')
+
+
+def prefetch_audio(message):
+    """Start downloading a message's audio in the background."""
+    try:
+        body = json.loads(message['Body'])
+    except json.JSONDecodeError:
+        return None
+    return download_executor.submit(download_job_audio, body)
+
+
+def delete_messages(sqs, messages):
+    """Delete processed messages, up to 10 per DeleteMessageBatch request."""
+    for start in range(0, len(messages), 10):
+        batch = messages[start:start + 10]
+        try:
+            response = sqs.delete_message_batch(
+                QueueUrl=SQS_QUEUE_URL,
+                Entries=[
+                    {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']}
+                    for i, message in enumerate(batch)
+                ]
+            )
+        except ClientError as e:
+            logger.error(f"Failed to delete message batch: {e}")
+            continue
+        for failed in response.get('Failed', []):
+            logger.error(f"Failed to delete message {batch[int(failed['Id'])]['MessageId']}: {failed.get('Message')}")
+
+
+def extend_visibility(sqs, messages):
+    """Keep not-yet-deleted messages of a batch hidden from other consumers."""
+    for start in range(0, len(messages), 10):
+        batch = messages[start:start + 10]
+        try:
+            response = sqs.change_message_visibility_batch(
+                QueueUrl=SQS_QUEUE_URL,
+                Entries=[
+                    {
+                        'Id': str(i),
+                        'ReceiptHandle': message['ReceiptHandle'],
+                        'VisibilityTimeout': VISIBILITY_TIMEOUT
+                    }
+                    for i, message in enumerate(batch)
+                ]
+            )
+        except ClientError as e:
+            logger.error(f"Failed to extend message visibility: {e}")
+            continue
+        for failed in response.get('Failed', []):
+            logger.error(f"Failed to extend visibility of message {batch[int(failed['Id'])]['MessageId']}: {failed.get('Message')}")
+
+
+class VisibilityHeartbeat:
+    """Extend the tracked messages every third of VISIBILITY_TIMEOUT from a background thread."""
+
+    def __init__(self, sqs, messages):
+        self.sqs = sqs
+        self.messages = list(messages)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='rem-visibility', daemon=True)
+        self.thread.start()
+
+    def track(self, messages):
+        """Replace the messages to keep hidden; dropped ones may reappear."""
+        with self.lock:
+            self.messages = list(messages)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(VISIBILITY_TIMEOUT / 3):
+            with self.lock:
+                messages = list(self.messages)
+            if messages:
+                extend_visibility(self.sqs, messages)
+
+
 def poll_queue():
     """Poll SQS queue for new transcription jobs."""
     if not SQS_QUEUE_URL:
@@ -119,9 +208,9 @@ def poll_queue():
             # Long polling
             response = sqs.receive_message(
                 QueueUrl=SQS_QUEUE_URL,
-                MaxNumberOfMessages=1,
+                MaxNumberOfMessages=MAX_MESSAGES,
                 WaitTimeSeconds=20,
-                VisibilityTimeout=300  # 5 minutes visibility timeout
+                VisibilityTimeout=VISIBILITY_TIMEOUT
             )
 
             messages = response.get('Messages', [])
@@ -129,30 +218,50 @@ def poll_queue():
             if not messages:
                 continue
 
-            for message in messages:
-                logger.info(f"📨 Received message: {message['MessageId']}")
-
-                try:
-                    body = json.loads(message['Body'])
-
-                    # Process the job
-                    start_time = time.time()
-                    success = process_transcription_job(body)
-                    duration = time.time() - start_time
-
-                    if success:
-                        logger.info(f"✅ Processing successful ({duration:.2f}s), deleting message")
-                        sqs.delete_message(
-                            QueueUrl=SQS_QUEUE_URL,
-                            ReceiptHandle=message['ReceiptHandle']
-                        )
-                    else:
-                        logger.error("❌ Processing failed, message will return to queue")
-
-                except json.JSONDecodeError:
-                    logger.error("Failed to decode message body")
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
+            # Jobs run one at a time; successful ones are deleted in batches once
+            # the batch is done. Until then the heartbeat keeps every message
+            # not deleted yet (failed ones excepted) hidden.
+            # The next message's audio downloads while the current job runs.
+            done = []
+            heartbeat = VisibilityHeartbeat(sqs, messages)
+            try:
+                prefetched = prefetch_audio(messages[0])
+                for index, message in enumerate(messages):
+                    current = prefetched
+                    prefetched = prefetch_audio(messages[index + 1]) if index + 1 < len(messages) else None
+
+                    logger.info(f"📨 Received message: {message['MessageId']}")
+
+                    try:
+                        body = json.loads(message['Body'])
+
+                        # Process the job
+                        start_time = time.time()
+                        audio = None
+                        if current is not None:
+                            try:
+                                audio = current.result()
+                            except Exception as e:
+                                logger.error(f"Failed to prefetch audio: {e}")
+                        success = process_transcription_job(body, audio)
+                        duration = time.time() - start_time
+
+                        if success:
+                            logger.info(f"✅ Processing successful ({duration:.2f}s), deleting message")
+                            done.append(message)
+                        else:
+                            logger.error("❌ Processing failed, message will return to queue")
+
+                    except json.JSONDecodeError:
+                        logger.error("Failed to decode message body")
+                    except Exception as e:
+                        logger.error(f"Error processing message: {e}")
+
+                    heartbeat.track(done + messages[index + 1:])
+
+                delete_messages(sqs, done)
+            finally:
+                heartbeat.stop()
 
         except KeyboardInterrupt:
             logger.info("Stopping worker...")